@@ -0,0 +1,178 @@
+"""End-to-end benchmark of the exp1a, exp1b and exp2 scenarios, run headlessly with a deterministic
+   scripted driver in place of the manual controls. Reports simulation ticks per second, how the
+   time splits between triggers, controllers, logging, result writing and the rest of the
+   simulation, and the peak memory of each round. Needs the driving_simulator submodule. Run with
+        python3 benchmarks/bench_scenarios.py [--output report.json] [--quick] [--compare baseline.json]"""
+import importlib.util
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from bench_utils import ROOT,runMain
+
+import linear_controller_classes as lcc
+from experiment_harness import Harness
+from trajectory_log import TrajectoryLog
+from trajectory_type_definitions import LaneChangeController
+from trigger_plan import TriggerPlan
+
+SCENARIO_FILES = {"exp1a":"exp1/a/exp1a.py","exp1b":"exp1/b/exp1b.py","exp2":"exp2/exp2.py"}
+
+#Scripted ego driving as (number of steps,acceleration,yaw rate) segments; (0,0) once they run out
+LANE_CHANGE = [(20,0.5,0),(15,0,8),(15,0,-8),(60,0.3,0)]
+LANE_KEEP = [(30,0.5,0),(60,0,0),(20,-0.5,0)]
+DRIVERS = {"exp1a":LANE_CHANGE,"exp1b":LANE_KEEP,"exp2":LANE_CHANGE}
+
+
+class ScriptedDriver():
+    """Replays a fixed action schedule, restarting it whenever the harness resets it for a new round"""
+    def __init__(self,schedule):
+        self.actions = [(accel,yaw_rate) for num_steps,accel,yaw_rate in schedule for _ in range(num_steps)]
+        self.index = 0
+
+
+    def selectAction(self,state,*args):
+        if self.index<len(self.actions):
+            action = self.actions[self.index]
+        else:
+            action = (0,0)
+        self.index += 1
+        return action
+
+
+    def reset(self):
+        self.index = 0
+
+
+class Timers():
+    """Accumulates exclusive time per category: time spent in a timed call nested inside another
+       is only counted against the inner one"""
+    def __init__(self):
+        self.totals = {}
+        self.stack = []
+
+
+    def wrap(self,name,func):
+        totals,stack = self.totals,self.stack
+        totals.setdefault(name,0.0)
+
+        def timed(*args,**kwargs):
+            stack.append(0.0)
+            start = time.perf_counter()
+            try:
+                return func(*args,**kwargs)
+            finally:
+                elapsed = time.perf_counter()-start
+                totals[name] += elapsed-stack.pop()
+                if stack: stack[-1] += elapsed
+
+        return timed
+
+
+def loadScenario(name):
+    spec = importlib.util.spec_from_file_location(name,os.path.join(ROOT,SCENARIO_FILES[name]))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.SCENARIO
+
+
+def patchClasses(timers):
+    """Times the shared hot paths for every instance, and every trigger compiled while patched.
+       Returns what is needed to undo it"""
+    #Where the controller step lives depends on the simulator version; fall back to the scripted controllers
+    if hasattr(lcc.DrivingController,"selectAction"):
+        controller_classes = [lcc.DrivingController]
+    else:
+        controller_classes = [LaneChangeController,ScriptedDriver]
+    patches = [(TriggerPlan,"invalidate","triggers"),(TrajectoryLog,"append","logging")]+[(x,"selectAction","controllers") for x in controller_classes]
+
+    originals = []
+    for cls,attribute,name in patches:
+        original = cls.__dict__[attribute]
+        originals.append((cls,attribute,original))
+        setattr(cls,attribute,timers.wrap(name,original))
+
+    #Compiled triggers are plain functions, so each is wrapped as it is made
+    compile = TriggerPlan.__dict__["compile"]
+    originals.append((TriggerPlan,"compile",compile))
+    TriggerPlan.compile = lambda plan,expression: timers.wrap("triggers",compile(plan,expression))
+    return originals
+
+
+def unpatchClasses(originals):
+    for cls,attribute,original in originals:
+        setattr(cls,attribute,original)
+
+
+def runRounds(scenario,name,experiment_order,data_address,result_format,track_memory):
+    """Runs the rounds on one harness. Returns the timers, per round (ticks,seconds), the time taken
+       to flush the background writer at the end and per round peak traced memory (empty unless
+       track_memory)"""
+    scenario.data_address = data_address
+    timers = Timers()
+    #Patched before the harness is built, so the triggers the scenario compiles are timed
+    originals = patchClasses(timers)
+    try:
+        harness = Harness(scenario,headless=True,driver=ScriptedDriver(DRIVERS[name]))
+    except:
+        unpatchClasses(originals)
+        raise
+    harness.sim.runComplete = timers.wrap("simulation",harness.sim.runComplete)
+    harness.writeRound = timers.wrap("io",harness.writeRound)
+
+    rounds,peaks = [],[]
+    flush = 0.0
+    try:
+        for i,round_types in enumerate(experiment_order):
+            if track_memory:
+                tracemalloc.start()
+            start = time.perf_counter()
+            harness.run([round_types],exp_start_time="2000-01-01_00-00-00",round_offset=i,num_rounds=len(experiment_order),result_format=result_format)
+            rounds.append((len(harness.ego_controller.getLog()),time.perf_counter()-start))
+            if track_memory:
+                peaks.append(tracemalloc.get_traced_memory()[1])
+                tracemalloc.stop()
+        if harness.writer is not None:
+            start = time.perf_counter()
+            timers.wrap("io",harness.writer.flush)()
+            flush = time.perf_counter()-start
+    finally:
+        unpatchClasses(originals)
+        harness.wrapUp()
+    return timers,rounds,flush,peaks
+
+
+def benchScenario(name,num_observations,result_format):
+    scenario = loadScenario(name)
+    experiment_order = list(scenario.round_types)*num_observations
+    data_address = tempfile.mkdtemp()
+    try:
+        timers,rounds,flush,_ = runRounds(scenario,name,experiment_order,data_address,result_format,False)
+        #Memory is traced in a second, identical pass since tracing slows everything down
+        _,_,_,peaks = runRounds(scenario,name,experiment_order,data_address,result_format,True)
+    finally:
+        shutil.rmtree(data_address)
+
+    ticks = sum([x for x,_ in rounds])
+    total = sum([x for _,x in rounds])+flush
+    #"simulation" is the simulator's own stepping (runComplete less the triggers, controllers and
+    # logging it calls) and "other" is the rest of the round loop: set up, overlay and resets
+    times = dict(timers.totals)
+    times["total"] = total
+    times["other"] = total-sum(timers.totals.values())
+
+    return {"rounds":len(rounds),"ticks":ticks,"ticks_per_s":ticks/total if total>0 else 0.0,\
+            "mean_round_s":total/len(rounds),"time_s":times,"time_fraction":{key:value/total for key,value in times.items() if key != "total"},\
+            "peak_memory_bytes":{"max":max(peaks),"mean":sum(peaks)/len(peaks),"per_round":peaks},\
+            "us_per_tick":1e6*total/ticks if ticks>0 else 0.0}
+
+
+def run(quick=False,result_format="text"):
+    num_observations = 1 if quick else 5
+    return {name:benchScenario(name,num_observations,result_format) for name in SCENARIO_FILES}
+
+
+if __name__ == "__main__":
+    runMain(run,"Headless end-to-end scenario benchmark",metric="us_per_tick")
@@ -0,0 +1,103 @@
+"""Cold start report for the experiment entry points. Each scenario is started in a fresh
+   interpreter, from its own directory as a participant would run it, and built headlessly with a
+   scripted driver. Reports the time from launching the process to the first simulation step, how
+   much of that is importing the scenario and building the harness, which heavy modules are loaded
+   at each point, and the slowest imports (from python -X importtime). Needs the driving_simulator
+   submodule. Run with
+        python3 benchmarks/bench_startup.py [--output report.json] [--quick] [--compare baseline.json]"""
+import json
+import os
+import sys
+import time
+
+#Kept light: the child processes import this file, and anything imported here would count against the scenario
+SCENARIO_FILES = {"exp1a":"exp1/a/exp1a.py","exp1b":"exp1/b/exp1b.py","exp2":"exp2/exp2.py","sandbox":"sandbox.py"}
+HEAVY_MODULES = ["pygame","matplotlib","pyautogui","simulator","vehicle_classes","linear_controller_classes","road_classes"]
+NUM_SLOWEST = 10
+
+
+def child(path):
+    """Run in the fresh interpreter: imports the scenario at path and runs its first step headlessly.
+       Prints the timings as JSON"""
+    start = time.perf_counter()
+    import importlib.util
+    spec = importlib.util.spec_from_file_location("scenario",path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    imported = time.perf_counter()
+    loaded_on_import = [x for x in HEAVY_MODULES if x in sys.modules]
+
+    first_step = []
+
+    class FirstStepDriver():
+        def selectAction(self,state,*args):
+            if not first_step:
+                first_step.append((time.time(),time.perf_counter()))
+            return (0,0)
+
+    from experiment_harness import Harness
+    scenario = module.SCENARIO
+    scenario.data_address = None
+    harness = Harness(scenario,headless=True,driver=FirstStepDriver(),background_writes=False)
+    built = time.perf_counter()
+    loaded_on_build = [x for x in HEAVY_MODULES if x in sys.modules]
+    try:
+        harness.run([scenario.round_types[0] if scenario.round_types else ()],exp_start_time="2000-01-01_00-00-00")
+    finally:
+        harness.wrapUp()
+
+    print(json.dumps({"import_s":imported-start,"build_s":built-imported,"first_step_s":first_step[0][1]-built,"first_step_time":first_step[0][0],\
+                      "loaded_on_import":loaded_on_import,"loaded_on_build":loaded_on_build}))
+
+
+def slowestImports(importtime_output):
+    """The NUM_SLOWEST top level imports by cumulative time (seconds) from python -X importtime"""
+    imports = []
+    for line in importtime_output.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _,cumulative,name = line[len("import time:"):].split("|")
+        #Nested imports are indented further; top level ones have a single space
+        if name.startswith("  "):
+            continue
+        imports.append((name.strip(),int(cumulative)/1e6))
+    imports.sort(key=lambda x: -x[1])
+    return imports[:NUM_SLOWEST]
+
+
+def coldStart(name):
+    import subprocess
+    from bench_utils import ROOT
+    path = os.path.abspath(os.path.join(ROOT,SCENARIO_FILES[name]))
+    launched = time.time()
+    process = subprocess.run([sys.executable,"-X","importtime",os.path.abspath(__file__),"--child",path],cwd=os.path.dirname(path),\
+                             capture_output=True,text=True)
+    if process.returncode != 0:
+        raise RuntimeError("{} failed to start:\n{}".format(name,process.stderr[-2000:]))
+    result = json.loads(process.stdout.strip().splitlines()[-1])
+    result["cold_start_s"] = result.pop("first_step_time")-launched
+    result["slowest_imports"] = slowestImports(process.stderr)
+    return result
+
+
+def run(quick=False):
+    import numpy as np
+    num_repeats = 1 if quick else 5
+    results = {}
+    for name in SCENARIO_FILES:
+        runs = [coldStart(name) for _ in range(num_repeats)]
+        #Medians over the repeats; the module lists and slowest imports are from the median run
+        order = np.argsort([x["cold_start_s"] for x in runs])
+        result = runs[order[len(order)//2]]
+        for key in ("cold_start_s","import_s","build_s","first_step_s"):
+            result[key] = float(np.median([x[key] for x in runs]))
+        results[name] = result
+    return results
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "--child":
+        child(sys.argv[2])
+    else:
+        from bench_utils import runMain
+        runMain(run,"Cold start to first step of the experiment entry points",metric="cold_start_s")
@@ -0,0 +1,101 @@
+"""Micro-benchmarks for libraries/trajectory_type_definitions over a range of horizons T and
+   timesteps dt. Run from anywhere with
+        python3 benchmarks/bench_trajectory.py [--output report.json] [--quick] [--compare baseline.json]"""
+import math
+
+from bench_utils import measure,runMain
+
+from trajectory_type_definitions import LaneChangeController,LaneChangeTrajectory,laneChange
+
+#A lane change across one lane of a 5m wide road, as in exp1b
+INIT_STATE = {"position":(10.0,7.5),"velocity":5.0,"heading":0.0}
+DEST_STATE = {"position":(60.0,2.5),"velocity":5.5,"heading":0.0}
+AXLE_LENGTH = 2.72
+
+T_VALUES = [5,15,30]
+DT_VALUES = [.1,.05,.01]
+
+
+def benchTrajectory(T,dt,calls):
+    """Construction and evaluation at a single (T,dt)"""
+    results = {}
+    trajectory = LaneChangeTrajectory(INIT_STATE,DEST_STATE,T)
+    times = [i*dt for i in range(int(T/dt)+1)]
+    num_times = len(times)
+
+    results["laneChange"] = measure(lambda: laneChange(INIT_STATE,DEST_STATE,T),calls=calls)
+    results["LaneChangeTrajectory"] = measure(lambda: LaneChangeTrajectory(INIT_STATE,DEST_STATE,T),calls=calls)
+
+    #Scalar evaluation at every point of the horizon; latency is per point
+    def everyAction():
+        for t in times: trajectory.action(t,AXLE_LENGTH)
+
+    def everyState():
+        for t in times: trajectory.state(t,AXLE_LENGTH)
+
+    for name,func in (("action",everyAction),("state",everyState)):
+        result = measure(func,calls=max(20,calls//num_times))
+        for key in ("mean_us","p50_us","p90_us","p99_us"):
+            result[key] /= num_times
+        result["throughput_per_s"] *= num_times
+        result["points_per_call"] = num_times
+        results[name] = result
+
+    #complete*Lists are memoised on the trajectory, so the memo is cleared (untimed) before every call
+    def fresh():
+        trajectory.samples = None
+        return trajectory
+
+    results["completePositionList"] = measure(lambda x: x.completePositionList(dt),setup=fresh,calls=calls)
+    results["completeVelocityList"] = measure(lambda x: x.completeVelocityList(dt),setup=fresh,calls=calls)
+    results["completeHeadingList"] = measure(lambda x: x.completeHeadingList(dt),setup=fresh,calls=calls)
+    results["completeActionList"] = measure(lambda x: x.completeActionList(AXLE_LENGTH,dt),setup=fresh,calls=calls)
+    results["completeActionList_memoised"] = measure(lambda: trajectory.completeActionList(AXLE_LENGTH,dt),calls=calls)
+    return results
+
+
+def benchController(T,dt,calls,replan_every=1):
+    """selectAction for every step of the horizon, on a kinematic rollout of the controller's own
+       actions, so the controller sees the states it would in a run. Latency is per step, and
+       includes the (small) cost of the rollout itself"""
+    num_steps = int(T/dt)+2
+
+    def newController():
+        return LaneChangeController(timestep=dt,dest_state=DEST_STATE,axle_length=AXLE_LENGTH,T=T,replan_every=replan_every)
+
+    def rollout(controller):
+        x,y = INIT_STATE["position"]
+        velocity,heading = INIT_STATE["velocity"],INIT_STATE["heading"]
+        for _ in range(num_steps):
+            accel,yaw_rate = controller.selectAction({"position":(x,y),"velocity":velocity,"heading":heading})
+            x += velocity*math.cos(math.radians(heading))*dt
+            y -= velocity*math.sin(math.radians(heading))*dt
+            velocity += accel*dt
+            heading = (heading+yaw_rate*dt)%360
+
+    result = measure(rollout,setup=newController,calls=max(20,calls//num_steps))
+    for key in ("mean_us","p50_us","p90_us","p99_us"):
+        result[key] /= num_steps
+    result["throughput_per_s"] *= num_steps
+    result["steps_per_call"] = num_steps
+    return result
+
+
+def run(quick=False):
+    calls = 50 if quick else 2000
+    T_values = T_VALUES[:1] if quick else T_VALUES
+    dt_values = DT_VALUES[:1] if quick else DT_VALUES
+
+    results = {}
+    for T in T_values:
+        for dt in dt_values:
+            suffix = "[T={},dt={}]".format(T,dt)
+            for name,result in benchTrajectory(T,dt,calls).items():
+                results[name+suffix] = result
+            results["selectAction"+suffix] = benchController(T,dt,calls*10)
+            results["selectAction_replan10"+suffix] = benchController(T,dt,calls*10,replan_every=10)
+    return results
+
+
+if __name__ == "__main__":
+    runMain(run,"Trajectory and lane change controller micro-benchmarks")
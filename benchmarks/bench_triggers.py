@@ -0,0 +1,186 @@
+"""Cost per simulation tick of exp1b's triggers (a passive round: the lane changer's four triggers
+   and the three that end the round), evaluated through a TriggerPlan and through the closures the
+   experiment scripts used before the plan, copied here as the baseline. Each tick the cars are
+   moved along a lane change, then every trigger is called once, as the simulator does. The plan
+   is invalidated once per car per tick, as the harness does when each car steps, and that is
+   timed with the triggers. Needs the driving_simulator submodule (for road_classes). Run with
+        python3 benchmarks/bench_triggers.py [--output report.json] [--quick] [--compare baseline.json]"""
+import math
+
+from bench_utils import measure,runMain
+
+import road_classes
+from trigger_plan import And,DistanceTravelled,Heading,Idle,OnLane,RelativeX,RelativeY,TriggerPlan
+
+VEH_LENGTH = 4.6
+VEH_WIDTH = 2
+LANE_WIDTH = 5
+NUM_STEPS = 150
+
+
+class BenchLane(road_classes.Lane):
+    """Only needs to be a Lane for the lane checks; nothing else about the road is used"""
+    def __init__(self):
+        self.on = []
+
+
+class BenchRoad():
+    pass
+
+
+class BenchCar():
+    def __init__(self):
+        self.state = {"position":(0,0),"heading":0}
+        self.on = []
+        self.accel = 0
+        self.yaw_rate = 0
+        self.length = VEH_LENGTH
+
+
+class Scene():
+    """Two cars on a two lane road: the lane keeper drives straight, the lane changer pulls in
+       ahead of it over the first half of the run and then holds its lane. Each car is on the road
+       and on whichever lanes it overlaps"""
+    def __init__(self):
+        self.lane_keeper,self.lane_changer = BenchCar(),BenchCar()
+        self.lanes = [BenchLane(),BenchLane()]
+        self.road = BenchRoad()
+        self.step = 0
+        self.move()
+
+
+    def move(self):
+        t = (self.step%NUM_STEPS)/NUM_STEPS
+        changing = min(1.0,2*t)
+        self.lane_keeper.state = {"position":(10+90*t,LANE_WIDTH*1.5),"heading":0}
+        self.lane_changer.state = {"position":(15+90*t,LANE_WIDTH*(0.5+changing)),"heading":(0 if changing == 1 else 5*math.sin(math.pi*changing))}
+        self.lane_changer.accel = self.lane_changer.yaw_rate = (0 if changing == 1 else 1)
+        for car in (self.lane_keeper,self.lane_changer):
+            y = car.state["position"][1]
+            car.on = [self.road]+[lane for i,lane in enumerate(self.lanes) if abs(y-LANE_WIDTH*(i+0.5))<(LANE_WIDTH+VEH_WIDTH)/2]
+        for lane in self.lanes:
+            lane.on = [car for car in (self.lane_keeper,self.lane_changer) if lane in car.on]
+        self.step += 1
+
+
+###################################################################################################################
+#The closures exp1b built its triggers from before the trigger plan
+
+def onLaneTrigger(ego_car, trigger_car):
+    def f():
+        ego_lanes = [x for x in ego_car.on if isinstance(x,road_classes.Lane)]
+        trigger_lanes = [x for x in trigger_car.on if isinstance(x,road_classes.Lane)]
+        return True in [x in ego_lanes for x in trigger_lanes]
+
+    return f
+
+
+def distanceTravelledTrigger(ego_car,threshold):
+    def f():
+        return ego_car.state["position"][0]>threshold
+
+    return f
+
+
+def relativeXRadiusTrigger(ego_car,trigger_car,radius,rel='>'):
+    def f():
+        if rel == '=': return ego_car.state["position"][0] - trigger_car.state["position"][0] == radius
+        elif rel == '<': return ego_car.state["position"][0] - trigger_car.state["position"][0] < radius
+        else: return ego_car.state["position"][0] - trigger_car.state["position"][0] > radius
+
+    return f
+
+
+def relativeYRadiusTrigger(ego_car,trigger_car,radius,rel='>'):
+    def f():
+        if rel == '=': return abs(ego_car.state["position"][1] - trigger_car.state["position"][1]) == radius
+        elif rel == '<': return abs(ego_car.state["position"][1] - trigger_car.state["position"][1]) < radius
+        else: return abs(ego_car.state["position"][1] - trigger_car.state["position"][1]) > radius
+
+    return f
+
+
+def headingTrigger(ego_car,radius):
+    def f():
+        return abs(ego_car.state["heading"])<radius or abs(ego_car.state["heading"])>360-radius
+
+    return f
+
+
+def andTrigger(triggers):
+    def f():
+        res = True
+        for trigger in triggers:
+            res = res and trigger()
+        return res
+
+    return f
+
+
+def headingFixTrigger(car):
+    def f():
+        return car.accel == 0 and car.yaw_rate==0
+
+    return f
+
+
+def closureTriggers(scene):
+    """exp1b's triggers, and what needs doing as each car steps (nothing)"""
+    lane_changer,lane_keeper = scene.lane_changer,scene.lane_keeper
+    return [],[relativeXRadiusTrigger(lane_changer,lane_keeper,VEH_LENGTH,'>'),\
+            andTrigger([onLaneTrigger(lane_changer,lane_keeper),relativeXRadiusTrigger(lane_changer,lane_keeper,VEH_LENGTH,'<')]),\
+            relativeXRadiusTrigger(lane_keeper,lane_changer,VEH_LENGTH,rel='>'),headingFixTrigger(lane_changer),\
+            andTrigger([distanceTravelledTrigger(lane_keeper,60),onLaneTrigger(lane_changer,lane_keeper),headingTrigger(lane_changer,2),\
+                        relativeYRadiusTrigger(lane_changer,lane_keeper,LANE_WIDTH/4,'<')]),\
+            distanceTravelledTrigger(lane_keeper,105),distanceTravelledTrigger(lane_changer,105)]
+
+
+def planTriggers(scene,per_tick=True):
+    """The same triggers as exp1b compiles them, and what needs doing as each car steps. With
+       per_tick node values are kept until the next car steps, as in the harness; without it they
+       are evaluated afresh on every call"""
+    lane_changer,lane_keeper = scene.lane_changer,scene.lane_keeper
+    plan = TriggerPlan(per_tick=per_tick)
+    expressions = [RelativeX(lane_changer,lane_keeper,VEH_LENGTH,'>'),\
+                   And([OnLane(lane_changer,lane_keeper),RelativeX(lane_changer,lane_keeper,VEH_LENGTH,'<')]),\
+                   RelativeX(lane_keeper,lane_changer,VEH_LENGTH,rel='>'),Idle(lane_changer),\
+                   And([DistanceTravelled(lane_keeper,60),OnLane(lane_changer,lane_keeper),Heading(lane_changer,2),\
+                        RelativeY(lane_changer,lane_keeper,LANE_WIDTH/4,'<')]),\
+                   DistanceTravelled(lane_keeper,105),DistanceTravelled(lane_changer,105)]
+    return ([plan.invalidate,plan.invalidate] if per_tick else []),[plan.compile(x) for x in expressions]
+
+
+def benchTick(make_triggers,calls):
+    """Latency of calling every trigger once, per tick; moving the cars is not timed"""
+    scene = Scene()
+    step_hooks,triggers = make_triggers(scene)
+
+    def callAll(_):
+        for hook in step_hooks:
+            hook()
+        for trigger in triggers:
+            trigger()
+
+    return measure(callAll,setup=scene.move,calls=calls)
+
+
+def run(quick=False):
+    calls = 2000 if quick else 20000
+    results = {"closures":benchTick(closureTriggers,calls),"plan":benchTick(planTriggers,calls),\
+               "plan_uncached":benchTick(lambda scene: planTriggers(scene,per_tick=False),calls)}
+    #The plan has to agree with the closures on every tick it is timed on
+    scene = Scene()
+    _,closures = closureTriggers(scene)
+    step_hooks,compiled = planTriggers(scene)
+    for _ in range(NUM_STEPS):
+        if [bool(x()) for x in closures] != [bool(x()) for x in compiled]:
+            raise RuntimeError("The trigger plan disagrees with the closures at step {}".format(scene.step))
+        scene.move()
+        for hook in step_hooks:
+            hook()
+    results["plan"]["speedup_over_closures"] = results["closures"]["p50_us"]/results["plan"]["p50_us"]
+    return results
+
+
+if __name__ == "__main__":
+    runMain(run,"Per tick cost of exp1b's triggers, trigger plan against the original closures")
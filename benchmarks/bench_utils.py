@@ -0,0 +1,130 @@
+import datetime
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+#Make the libraries importable however the benchmarks are launched
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)),"..")
+sys.path.insert(0,os.path.join(ROOT,"libraries/driving_simulator"))
+sys.path.insert(0,os.path.join(ROOT,"libraries"))
+
+PERCENTILES = [50,90,99]
+
+
+def measure(func,setup=None,calls=1000,warmup=10,alloc_calls=50):
+    """Times calls to func() one at a time, with garbage collection off while timing.
+       setup, if given, is called (untimed) before every call, and whatever it returns is passed to func.
+       Allocations are measured separately with tracemalloc over alloc_calls calls, since tracing
+       distorts the timings. Returns a dictionary of per-call latency percentiles (microseconds),
+       the mean, throughput (calls per second), peak bytes allocated during a call and bytes still
+       held after it"""
+    def call():
+        if setup is None:
+            return func()
+        return func(setup())
+
+    for _ in range(warmup):
+        call()
+
+    latencies = np.empty(calls)
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for i in range(calls):
+            if setup is None:
+                start = time.perf_counter_ns()
+                func()
+            else:
+                arg = setup()
+                start = time.perf_counter_ns()
+                func(arg)
+            latencies[i] = time.perf_counter_ns()-start
+    finally:
+        if gc_was_enabled: gc.enable()
+    latencies /= 1000.0
+
+    peak,retained = np.empty(alloc_calls),np.empty(alloc_calls)
+    tracemalloc.start()
+    for i in range(alloc_calls):
+        arg = None if setup is None else setup()
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        result = func() if setup is None else func(arg)
+        current,peak_memory = tracemalloc.get_traced_memory()
+        peak[i] = peak_memory-before
+        retained[i] = current-before
+        del result
+    tracemalloc.stop()
+
+    report = {"calls":calls,"mean_us":float(latencies.mean())}
+    for percentile,value in zip(PERCENTILES,np.percentile(latencies,PERCENTILES)):
+        report["p{}_us".format(percentile)] = float(value)
+    report["throughput_per_s"] = float(1e6/latencies.mean()) if latencies.mean()>0 else float("inf")
+    report["alloc_peak_bytes"] = float(np.median(peak))
+    report["alloc_retained_bytes"] = float(np.median(retained))
+    return report
+
+
+def environment():
+    """What the numbers were measured on"""
+    try:
+        commit = subprocess.run(["git","rev-parse","--short","HEAD"],cwd=ROOT,capture_output=True,text=True).stdout.strip()
+    except OSError:
+        commit = ""
+    return {"time":datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S"),"commit":commit,"python":platform.python_version(),\
+            "numpy":np.__version__,"platform":platform.platform(),"processor":platform.processor()}
+
+
+def writeReport(report,path=None):
+    """Writes the report as JSON to path, or to stdout if path is None"""
+    text = json.dumps(report,indent=1,sort_keys=True)
+    if path is None:
+        print(text)
+    else:
+        output = open(path,"w")
+        output.write(text+"\n")
+        output.close()
+
+
+def compareReports(report,baseline,metric="p50_us",tolerance=0.2):
+    """Benchmarks in both reports whose metric grew by more than tolerance (a fraction) over the
+       baseline. Returns a list of (name,baseline value,new value)"""
+    regressions = []
+    for name,result in report["results"].items():
+        if name in baseline["results"]:
+            old,new = baseline["results"][name][metric],result[metric]
+            if new>old*(1+tolerance):
+                regressions.append((name,old,new))
+    return regressions
+
+
+def runMain(run,description,metric="p50_us"):
+    """Command line shared by the benchmark scripts: run(quick) returns the results dictionary and
+       metric is the (lower is better) value --compare checks"""
+    import argparse
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--output",help="write the JSON report here instead of stdout")
+    parser.add_argument("--quick",action="store_true",help="fewer calls and parameter values, for a smoke test")
+    parser.add_argument("--compare",help="baseline JSON report; exits with status 1 if any {} regressed".format(metric))
+    parser.add_argument("--tolerance",type=float,default=0.2,help="allowed fractional slowdown for --compare")
+    args = parser.parse_args()
+
+    report = {"environment":environment(),"results":run(args.quick)}
+    writeReport(report,args.output)
+
+    if args.compare is not None:
+        baseline_file = open(args.compare,"r")
+        baseline = json.load(baseline_file)
+        baseline_file.close()
+        regressions = compareReports(report,baseline,metric=metric,tolerance=args.tolerance)
+        for name,old,new in regressions:
+            print("Regression: {} {} {:.2f} -> {:.2f}".format(name,metric,old,new),file=sys.stderr)
+        if regressions:
+            exit(1)
@@ -0,0 +1,9 @@
+"""Shared set up and round loop for the experiments. An experiment is described by a ScenarioSpec
+   (road, cars with their starts and destinations, controllers, triggers and round order) and run
+   with runScenario, which builds the simulator once and resets it between rounds"""
+from .controllers import changeController,fixHeading,resetController
+from .harness import Harness,logRecords,runScenario
+from .overlay import INSTRUCTIONS,TextOverlay,alwaysTrigger,loadFont
+from .replay import ReplayDriver,Replayer,compareStates,replayResults,replayRound
+from .scheduler import FixedStepScheduler,SimulatorStepper,StepTimes
+from .spec import DEFAULT_PARAMS,CarSpec,RoadSpec,ScenarioSpec,experimentOrder
@@ -0,0 +1,31 @@
+###################################################################################################################
+#Car controller triggers
+
+def changeController(car,tag):
+    def f():
+        old_controller = car.controller
+        car.setController(tag=tag)
+        #Hand the log from old controller to new so they seem like a single contiuous controller.
+        # The list is shared rather than copied, so the switch costs the same however long the round has run
+        new_controller = car.controller
+        new_controller.log = old_controller.log
+
+    return f
+
+
+def fixHeading(car):
+    #Manually adjust heading due to discretisaion error between trajectory and execution
+    def f():
+        car.heading = 0
+
+    return f
+
+
+def resetController(controller):
+    """Returns a controller to its start of round state in place: its log (a list or TrajectoryLog)
+       is emptied without being reallocated, and the controller it wraps (see
+       Harness.scriptedController) is reset if it has a reset method"""
+    controller.log.clear()
+    inner = getattr(controller,"controller",None)
+    if hasattr(inner,"reset"):
+        inner.reset()
@@ -0,0 +1,409 @@
+import datetime
+import math
+
+from result_index import indexRound
+from result_io import carRecord,writeResults
+from result_writer import ResultWriter
+from trajectory_log import TrajectoryLog
+from trigger_plan import TriggerPlan
+
+from .controllers import resetController
+from .overlay import INSTRUCTIONS,TextOverlay,alwaysTrigger
+from .scheduler import FixedStepScheduler,SimulatorStepper,StepTimes
+
+
+class Harness():
+    """Builds a scenario's simulator, cars, controllers and triggers once. Rounds are then run on
+       the same objects, resetting the simulator in place between them.
+       driver, if given, replaces the participant's manual controls; it is any controller object with
+       a selectAction(state) method (e.g. a scripted or recorded driver). headless skips all graphics
+       and so requires a driver.
+       With background_writes each round's results are handed to a ResultWriter, so the next round
+       starts while they are written.
+       instrumentation, if given, is an Instrumentation that times the triggers, controllers, overlay
+       and result writes and summarises each round. Without it nothing is wrapped.
+       The simulator modules are imported when the harness is built, and pygame only when there is a
+       window, so importing a scenario (e.g. to list its rounds) or running it headlessly does not
+       load the graphics stack"""
+    def __init__(self,spec,headless=False,driver=None,debug=False,background_writes=True,instrumentation=None):
+        if headless and driver is None:
+            print("Error, headless mode needs a driver to replace the manual controls")
+            exit(-1)
+
+        self.spec = spec
+        self.params = spec.params
+        self.headless = headless
+        self.debug = debug
+
+        #Filled in by the scenario's setup, and available to its setup_round. Every controller in
+        # controllers is reset in place at the start of each round (see resetControllers)
+        self.controllers = {}
+        self.triggers = {}
+        #All triggers are compiled into a single plan so shared checks are only computed once per tick
+        self.trigger_plan = TriggerPlan(per_tick=True)
+
+        self.cars = {}
+        self.ego = None
+        self.ego_controller = None
+        #One log per car, sized for a full length round, shared by all of the car's controllers
+        self.logs = {}
+        self.controller_cars = {} #id(controller) -> name of the car it controls
+        self._buildCars(driver)
+        self.sim = self._buildSimulator()
+
+        self.writer = None
+        if background_writes and spec.data_address is not None:
+            self.writer = ResultWriter()
+
+        self.screen = None
+        self.overlay = None
+        self.scheduler = None
+        self.stepper = None
+        #Wall-clock jitter of each step of the last round, when the steps are scheduled by the harness
+        self.step_times = StepTimes(int(spec.road.runtime/self.params["dt"])+2)
+        if not headless:
+            self._initialiseGraphics()
+
+        if spec.setup is not None:
+            spec.setup(self)
+
+        self.instrumentation = instrumentation
+        self.trigger_names = {}
+        if instrumentation is not None:
+            self._instrumentControllers()
+            #With background writes this is the time to hand the round over, not to write it
+            self.writeRound = instrumentation.wrap("writes","round",self.writeRound)
+
+
+    def _buildCars(self,driver):
+        import linear_controller_classes as lcc
+        import vehicle_classes
+        params = self.params
+        dt = params["dt"]
+        car_params = {"length":params["veh_length"],"width":params["veh_width"]}
+
+        #Human Controlled Car (this is the car being modelled) is always built first
+        car_specs = sorted(self.spec.cars,key=lambda x: not x.ego)
+        for i,car_spec in enumerate(car_specs):
+            self.cars[car_spec.name] = vehicle_classes.Car(None,car_spec.ego,i+1,timestep=dt,car_params=car_params,debug=self.debug)
+            self.logs[car_spec.name] = TrajectoryLog(int(self.spec.road.runtime/dt)+2)
+
+        ego_spec = car_specs[0]
+        self.ego = self.cars[ego_spec.name]
+        if driver is None:
+            self.ego_controller = lcc.DrivingController(controller="manual",ego=self.ego,speed_limit=params["speed_limit"],yaw_rate_range=params["yaw_rate_range"],\
+                                                        accel_range=params["participant_accel_range"],accel_jerk=params["accel_jerk"],yaw_rate_jerk=params["yaw_rate_jerk"])
+            self.controller_cars[id(self.ego_controller)] = ego_spec.name
+        else:
+            self.ego_controller = self.scriptedController(ego_spec.name,driver,accel_range=params["participant_accel_range"])
+        self.ego.addControllers({"default":self.ego_controller})
+        self.ego.setController(tag="default")
+
+
+    def _buildSimulator(self):
+        """The road, and the cars placed at their starts. Built once per harness"""
+        import simulator
+        road = self.spec.road
+        params = self.params
+        run_graphics = not self.headless
+
+        #Initialise the simulator object, load vehicles into the simulation, then initialise the action simulation
+        sim = simulator.Simulator(run_graphics,road.draw_traj,road.runtime,self.debug,dt=params["dt"],graphic_position=(0,0),graphic_dimensions=params["window"])
+        sim.loadCars([self.cars[car_spec.name] for car_spec in self.spec.cars])
+
+        car_speeds = [car_spec.init_speed for car_spec in self.spec.cars]
+        starts = [car_spec.start for car_spec in self.spec.cars]
+        dests = [car_spec.dest for car_spec in self.spec.cars] #Simulation ends when either car passes the end of the road
+        sim.initialiseSimulator(road.num_junctions,len(road.lengths),road.angles,road.lengths,road.junc_pairs,\
+                                                        car_speeds,starts,dests,lane_width=params["lane_width"])
+
+        for car_spec in self.spec.cars:
+            if car_spec.reverse_heading:
+                car = self.cars[car_spec.name]
+                car.heading = (car.heading+180)%360
+                car.initialisation_params["heading"] = car.heading
+                car.sense()
+        return sim
+
+
+    def _initialiseGraphics(self):
+        import pygame
+        #Only the subsystems the experiments use (the display brings the event queue with it);
+        # pygame.init() would also start audio, the joystick and the rest
+        pygame.display.init()
+        pygame.font.init()
+        self.screen = self.sim.g_sim.screen #This is messy, but the best way to get this I think
+        h = self.params["window"][1]
+        self.overlay = TextOverlay(self.screen,self.params["font_size"],self.params["space_size"])
+        self.overlay.setBlock("instructions",INSTRUCTIONS,(0,int(h/5)))
+
+        step_mode = self.params["step_mode"]
+        if step_mode == "fixed":
+            dt = self.params["dt"]
+            self.scheduler = FixedStepScheduler(dt,frame_rate=self.params["frame_rate"])
+            self.stepper = SimulatorStepper(self.sim,int(round(self.spec.road.runtime/dt)))
+        elif step_mode != "simulator":
+            print("Error, unknown step mode '{}'. Options are 'simulator' and 'fixed'".format(step_mode))
+            exit(-1)
+
+    ###############################################################################################################
+    #Helpers for scenario setup functions
+
+    def drivingController(self,name,controller,other=None,**kwargs):
+        """One of the simulator's own controllers ("idm","constant",...) for the named car"""
+        import linear_controller_classes as lcc
+        params = self.params
+        driving_controller = lcc.DrivingController(controller=controller,ego=self.cars[name],other=other,timestep=params["dt"],speed_limit=params["speed_limit"],accel_range=params["accel_range"],\
+                                                   accel_jerk=params["accel_jerk"],yaw_rate_range=params["yaw_rate_range"],yaw_rate_jerk=params["yaw_rate_jerk"],**kwargs)
+        self.controller_cars[id(driving_controller)] = name
+        return driving_controller
+
+
+    def scriptedController(self,name,controller,accel_range=None):
+        """Wraps any object with a selectAction(state) method as a controller for the named car"""
+        import linear_controller_classes as lcc
+        params = self.params
+        if accel_range is None:
+            accel_range = params["accel_range"]
+        driving_controller = lcc.DrivingController(controller="NA",ego=self.cars[name],other=None,timestep=params["dt"],speed_limit=params["speed_limit"],\
+                                                   accel_range=accel_range,accel_jerk=params["accel_jerk"])
+        driving_controller.controller = controller
+        self.controller_cars[id(driving_controller)] = name
+        return driving_controller
+
+
+    def addTrigger(self,expression,consequent,car=None):
+        """Compiles the trigger expression into the shared plan. The consequent fires on the named
+           car's triggers, or the simulator's if car is None. Returns the compiled trigger"""
+        trigger = self.trigger_plan.compile(expression)
+        if car is None:
+            self.sim.addTriggers({trigger:consequent})
+        else:
+            self.cars[car].addTriggers({trigger:consequent})
+        return trigger
+
+
+    def endWhen(self,expression):
+        """Ends the round once expression holds"""
+        return self.addTrigger(expression,self.endRound)
+
+
+    def endRound(self):
+        self.sim.endSimulation()
+
+    ###############################################################################################################
+
+    def run(self,experiment_order,exp_start_time=None,round_offset=0,num_rounds=None,result_format="text"):
+        """Runs each round in experiment_order and writes the results.
+           exp_start_time, round_offset and num_rounds let a run cover part of a larger experiment
+           (see parallel_runner); round i of experiment_order is saved as round round_offset+i.
+           result_format is "text" (the original format) or "binary" (see result_io)"""
+        if exp_start_time is None:
+            exp_start_time = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        if num_rounds is None and hasattr(experiment_order,"__len__"):
+            num_rounds = round_offset+len(experiment_order)
+
+        for i,round_types in enumerate(experiment_order,round_offset):
+            if self.spec.setup_round is not None:
+                self.spec.setup_round(self,round_types)
+            if not self.headless:
+                self._setOverlay(i,num_rounds,round_types)
+
+            ######################################################################
+            #Run simulation
+            self.sim.reinitialise()
+            self.resetControllers()
+            self.trigger_plan.invalidate()
+            if self.instrumentation is not None:
+                self._instrumentTriggers()
+                self.instrumentation.startRound(i)
+            self._runRound()
+
+            if self.spec.data_address is not None:
+                self.writeRound(i,round_types,exp_start_time,result_format)
+            if self.instrumentation is not None:
+                summary = self.instrumentation.endRound()
+                if self.scheduler is not None:
+                    summary["step_jitter"] = self.step_times.summary()
+
+        return exp_start_time
+
+
+    def _runRound(self):
+        if self.scheduler is None:
+            self.sim.runComplete() #will start from paused
+        else:
+            self.step_times.clear()
+            self.stepper.start()
+            self.scheduler.run(self.stepper.step,self.stepper.render,self.stepper.finished,self.step_times)
+
+
+    def resetControllers(self):
+        """Resets the ego controller and every controller in controllers in place, rather than
+           rebuilding them for each round. Controllers built with drivingController or
+           scriptedController are then pointed at their car's TrajectoryLog, so every step is
+           recorded straight into its arrays, and made to invalidate the trigger plan as their car
+           steps"""
+        reset = set()
+        for controller in [self.ego_controller]+list(self.controllers.values()):
+            if id(controller) not in reset:
+                resetController(controller)
+                reset.add(id(controller))
+                if id(controller) in self.controller_cars:
+                    controller.log = self.logs[self.controller_cars[id(controller)]]
+                    self._invalidateOnStep(controller)
+        for log in self.logs.values():
+            log.clear()
+
+
+    def _invalidateOnStep(self,controller):
+        """Invalidates the trigger plan whenever the controller is asked for an action, which is
+           just before its car moves, so the next trigger to be called sees the new state"""
+        select_action = controller.selectAction
+        if getattr(select_action,"invalidates_plan",False):
+            return
+        invalidate = self.trigger_plan.invalidate
+
+        def selectAction(*args,**kwargs):
+            invalidate()
+            return select_action(*args,**kwargs)
+
+        selectAction.invalidates_plan = True
+        controller.selectAction = selectAction
+
+
+    def _setOverlay(self,i,num_rounds,round_types):
+        """Sets the round label and directive, and the graphic simulator trigger that draws the text
+           every frame"""
+        directive = None if self.spec.directive is None else self.spec.directive(round_types)
+        task = None
+        if directive is not None:
+            task = [self.spec.round_label.format(i+1,num_rounds),directive]
+        w,h = self.params["window"]
+        self.overlay.setBlock("task",task,(int(w/2),int(h/5)))
+
+        g_sim = self.sim.g_sim
+        g_sim.triggers = {}
+        g_sim.addTriggers({alwaysTrigger():self.overlay.draw})
+
+    ###############################################################################################################
+    #Instrumentation (only used when the harness is given an Instrumentation)
+
+    def _instrumentControllers(self):
+        """Times selectAction of the ego controller and every controller in controllers. For
+           controllers wrapping an object (scripted controllers, lane change controllers) the
+           wrapped object's selectAction is timed, so replanning is included"""
+        named = [("ego",self.ego_controller)]+sorted(self.controllers.items(),key=lambda x: x[0])
+        timed = set()
+        for name,controller in named:
+            target = getattr(controller,"controller",None)
+            if not hasattr(target,"selectAction"):
+                target = controller
+            if id(target) not in timed and hasattr(target,"selectAction"):
+                target.selectAction = self.instrumentation.wrap("controllers",name,target.selectAction)
+                timed.add(id(target))
+        ego_log_controller = self.ego_controller
+        self.instrumentation.step = lambda: len(ego_log_controller.log)
+
+
+    def _instrumentTriggers(self):
+        """Times every trigger currently registered with the simulator and the cars, however it was
+           added. Run at the start of each round, since setup_round may replace triggers; ones
+           already timed are left as they are"""
+        owners = [("sim",self.sim)]+[(name,self.cars[name]) for name in sorted(self.cars)]
+        for owner_name,owner in owners:
+            triggers = {}
+            for trigger,consequent in owner.triggers.items():
+                if not hasattr(consequent,"__wrapped__"):
+                    name = self._triggerName(owner_name,trigger,consequent)
+                    trigger,consequent = self.instrumentation.wrapTrigger(name,trigger,consequent)
+                triggers[trigger] = consequent
+            owner.triggers = triggers
+
+        if self.overlay is not None:
+            g_sim = self.sim.g_sim
+            g_sim.triggers = {trigger:(consequent if hasattr(consequent,"__wrapped__") else self.instrumentation.wrap("overlay","text",consequent))\
+                                                for trigger,consequent in g_sim.triggers.items()}
+
+
+    def _triggerName(self,owner_name,trigger,consequent):
+        """A readable name that stays the same from round to round, e.g. "lane_keeper:And->changeController".
+           Names that would otherwise clash are numbered"""
+        consequent_name = getattr(consequent,"__qualname__",type(consequent).__name__).split(".<locals>")[0]
+        if getattr(trigger,"plan",None) is not None:
+            expression = trigger.plan.nodes[trigger.index][0]
+            trigger_name = "And" if isinstance(expression,str) else type(expression).__name__
+            key = (owner_name,trigger.index,consequent_name)
+        else:
+            trigger_name = getattr(trigger,"__qualname__",type(trigger).__name__).split(".<locals>")[0]
+            key = (owner_name,trigger_name,consequent_name)
+
+        if key not in self.trigger_names:
+            name = "{}:{}->{}".format(owner_name,trigger_name,consequent_name)
+            taken = set(self.trigger_names.values())
+            count = 1
+            while name in taken:
+                count += 1
+                name = "{}:{}->{}#{}".format(owner_name,trigger_name,consequent_name,count)
+            self.trigger_names[key] = name
+        return self.trigger_names[key]
+
+
+    def writeRound(self,i,round_types,exp_start_time,result_format):
+        """Extracts the log of behaviours from each car's controller and writes them as round i.
+           Returns the path written, or None if the round was handed to the background writer"""
+        params = self.params
+        header = {"num_cars":len(self.spec.record_order),"lane_width":params["lane_width"],"veh_length":params["veh_length"],\
+                  "veh_width":params["veh_width"],"dt":params["dt"],"speed_limit":params["speed_limit"]}
+
+        car_specs = {car_spec.name:car_spec for car_spec in self.spec.cars}
+        #Behaviour being modelled/learnt put in first, behaviour of all other cars goes after
+        cars = []
+        for name in self.spec.record_order:
+            car_spec,car = car_specs[name],self.cars[name]
+            controller = self.ego_controller if car is self.ego else car.controller
+            log = controller.getLog()
+            if isinstance(log,TrajectoryLog):
+                states,actions = log.records()
+            else:
+                states,actions = logRecords(log)
+            cars.append(carRecord(car_spec.label,round_types[car_spec.type_index],car,states,actions))
+
+        address = "{}/{}-{}-{}".format(self.spec.data_address,self.spec.result_prefix,exp_start_time,i)
+        if self.writer is not None:
+            #The logs move to new arrays when cleared, so can be reused for the next round straight away
+            self.writer.submit(address,header,cars,result_format)
+            return None
+        path = writeResults(address,header,cars,result_format)
+        indexRound(path,cars)
+        return path
+
+
+    def wrapUp(self):
+        """Waits for every round to be written, then shuts down the graphic screen"""
+        try:
+            if self.writer is not None:
+                self.writer.close()
+        finally:
+            self.sim.wrapUp()
+
+
+def logRecords(log):
+    """Converts a controller log into the (x,y,v,heading) states and (accel,yaw_rate) actions
+       written to the results, with angles in radians"""
+    states = [(x[0]["position"][0],x[0]["position"][1],x[0]["velocity"],math.radians(x[0]["heading"])) for x in log]
+    actions = [(x[1][0],math.radians(x[1][1])) for x in log]
+    return states,actions
+
+
+def runScenario(spec,experiment_order,headless=False,driver=None,exp_start_time=None,round_offset=0,num_rounds=None,result_format="text",debug=False,background_writes=True,\
+                instrumentation=None):
+    """Builds the scenario once, runs every round of experiment_order on it and shuts it down.
+       Rounds already finished are written even if a later one fails.
+       Returns the start time the results were saved under"""
+    harness = Harness(spec,headless=headless,driver=driver,debug=debug,background_writes=background_writes,instrumentation=instrumentation)
+    try:
+        exp_start_time = harness.run(experiment_order,exp_start_time=exp_start_time,round_offset=round_offset,num_rounds=num_rounds,result_format=result_format)
+    finally:
+        harness.wrapUp()
+    return exp_start_time
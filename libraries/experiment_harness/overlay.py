@@ -0,0 +1,74 @@
+INSTRUCTIONS = ["-Press and hold UP arrow to accelerate","-Press and hold DOWN arrow to decelerate","-Press and hold the LEFT arrow to turn anti-clockwise","-Press and hold RIGHT arrow to turn clockwise","-Press SPACE to pause/unpause simulation"]
+
+
+###################################################################################################################
+#Direction Writing Stuff
+WHITE = (255,255,255)
+
+#pygame.font.Font loads the font file, so each size is only loaded once
+FONTS = {}
+
+
+def loadFont(font_size):
+    #pygame is only imported once there is text to draw, so headless runs never load it
+    import pygame
+    if font_size not in FONTS:
+        FONTS[font_size] = pygame.font.Font(None,font_size)
+    return FONTS[font_size]
+
+
+class TextOverlay():
+    """Named blocks of text drawn on the screen every frame. Each line is rendered once, when its
+       block is set, and kept as a surface keyed by (text,font size,colour); draw only blits the
+       cached surfaces. Setting a block to the text it already shows does nothing, so the text is
+       only re-rendered when the round label or directive actually changes"""
+    def __init__(self,screen,font_size,space_size,colour=WHITE):
+        self.screen = screen
+        self.font_size = font_size
+        self.space_size = space_size
+        self.colour = colour
+        self.surfaces = {} #(text,font size,colour) -> rendered surface
+        self.blocks = {} #name -> (lines,start position,font size,colour)
+        self.blit_list = [] #(surface,position) for every line of every block, in the order they are drawn
+
+
+    def render(self,text,font_size,colour):
+        key = (text,font_size,colour)
+        if key not in self.surfaces:
+            self.surfaces[key] = loadFont(font_size).render(text,1,colour)
+        return self.surfaces[key]
+
+
+    def setBlock(self,name,text_lines,start_position,font_size=None,colour=None):
+        """Shows text_lines, one under the other, from start_position. text_lines None removes the block"""
+        if text_lines is None:
+            block = None
+        else:
+            block = (tuple(text_lines),tuple(start_position),font_size or self.font_size,colour or self.colour)
+        if self.blocks.get(name) == block:
+            return
+        if block is None:
+            del self.blocks[name]
+        else:
+            self.blocks[name] = block
+
+        blit_list = []
+        for lines,(x,y),font_size,colour in self.blocks.values():
+            for i,line in enumerate(lines):
+                blit_list.append((self.render(line,font_size,colour),(x,y+font_size*i+self.space_size*i)))
+        self.blit_list = blit_list
+        #Only keep the surfaces still on screen, so a new round label each round does not accumulate
+        self.surfaces = {key:self.surfaces[key] for key in [(line,font_size,colour) for lines,_,font_size,colour in self.blocks.values() for line in lines]}
+
+
+    def draw(self):
+        self.screen.blits(self.blit_list,doreturn=False)
+
+
+#Trigger functions to fire writing tasks. Graphic triggers are keyed by function, so each writing
+# task needs its own
+def alwaysTrigger():
+    def f():
+        return True
+
+    return f
@@ -0,0 +1,157 @@
+import copy
+import numpy as np
+
+from result_io import HEADER_FIELDS,STATE_COLUMNS
+from result_loader import iterResults,parseResultName
+
+from .harness import Harness
+
+#Largest allowed absolute difference between a replayed and a logged state (m, m/s and radians)
+DEFAULT_TOLERANCE = 1e-6
+HEADING_COLUMN = STATE_COLUMNS.index("heading")
+
+
+class ReplayDriver():
+    """Drives a car with a logged sequence of (accel,yaw_rate) actions, yaw rates in radians as
+       they are written to the results. Past the end of the log the car coasts with (0,0)"""
+    def __init__(self,actions=None):
+        self.actions = []
+        if actions is not None:
+            self.load(actions)
+        self.index = 0
+
+
+    def load(self,actions):
+        #Converted once, and to the degrees the controllers work in
+        actions = np.array(actions,dtype=float).reshape(-1,2)
+        self.actions = [(accel,yaw_rate) for accel,yaw_rate in zip(actions[:,0].tolist(),np.degrees(actions[:,1]).tolist())]
+        self.index = 0
+
+
+    def selectAction(self,state,*args):
+        if self.index<len(self.actions):
+            action = self.actions[self.index]
+        else:
+            action = (0,0)
+        self.index += 1
+        return action
+
+
+    def reset(self):
+        self.index = 0
+
+
+class Replayer():
+    """Re-simulates recorded rounds of one scenario headlessly, as fast as the simulator runs. The
+       scenario is built once, from the same spec (so the same initialiseSimulator set up and
+       triggers, including any that adjust the cars directly, like fixHeading).
+       The ego car and every scripted controller (from Harness.scriptedController, e.g. the lane
+       changes) are fed the car's logged actions by a ReplayDriver: scriptedController wraps the
+       object it is given as the DrivingController's controller attribute, and that object is
+       swapped for the car's ReplayDriver. Switches between scripted controllers then carry on
+       through the same action stream. The simulator's own controllers (idm, constant, ...) are
+       left as they are and compute their actions from the replayed states, as they did live.
+       params overrides the spec's params, e.g. with the values in the results header"""
+    def __init__(self,spec,params=None,tolerance=DEFAULT_TOLERANCE):
+        missing = [car_spec.name for car_spec in spec.cars if car_spec.name not in spec.record_order]
+        if missing:
+            print("Error, the results of {} do not include {}, so it cannot be replayed".format(spec.name,missing))
+            exit(-1)
+
+        replay_spec = copy.copy(spec)
+        replay_spec.data_address = None
+        replay_spec.params = dict(spec.params)
+        if params is not None:
+            replay_spec.params.update(params)
+        self.spec = replay_spec
+        self.tolerance = tolerance
+
+        self.drivers = {car_spec.name:ReplayDriver() for car_spec in spec.cars}
+        ego_name = [car_spec.name for car_spec in spec.cars if car_spec.ego][0]
+        self.harness = Harness(replay_spec,headless=True,driver=self.drivers[ego_name],background_writes=False)
+        for controller in self.harness.controllers.values():
+            if id(controller) in self.harness.controller_cars and hasattr(controller.controller,"selectAction"):
+                controller.controller = self.drivers[self.harness.controller_cars[id(controller)]]
+
+
+    def roundTypes(self,cars):
+        """The round's entry in the experiment order, rebuilt from the types written for each car"""
+        round_types = {}
+        for name,car in zip(self.spec.record_order,cars):
+            car_spec = [x for x in self.spec.cars if x.name == name][0]
+            if car_spec.type_index is not None:
+                round_types[car_spec.type_index] = car["type"]
+        return tuple([round_types.get(i) for i in range(len(round_types))])
+
+
+    def replay(self,cars):
+        """Replays one round given its cars (as loaded by result_loader.loadResults). Returns, for
+           each car name, how closely the replayed states match the logged ones (see compareStates)"""
+        for name,car in zip(self.spec.record_order,cars):
+            self.drivers[name].load(car["actions"])
+
+        self.harness.run([self.roundTypes(cars)],exp_start_time="replay")
+
+        report = {}
+        for name,car in zip(self.spec.record_order,cars):
+            states,_ = self.harness.logs[name].records()
+            report[name] = compareStates(np.asarray(car["states"],dtype=float).reshape(-1,len(STATE_COLUMNS)),states,self.tolerance)
+        return report
+
+
+    def wrapUp(self):
+        self.harness.wrapUp()
+
+
+def compareStates(logged,replayed,tolerance=DEFAULT_TOLERANCE):
+    """Compares logged and replayed (N,4) state arrays step by step. Headings are compared as angles.
+       Returns whether they match (same length, every difference within tolerance), the number of
+       steps of each, the largest difference per state column and the first step any difference
+       exceeds tolerance (None if none does)"""
+    num_steps = min(len(logged),len(replayed))
+    error = np.abs(replayed[:num_steps]-logged[:num_steps])
+    error[:,HEADING_COLUMN] = np.abs((error[:,HEADING_COLUMN]+np.pi)%(2*np.pi)-np.pi)
+    exceeded = np.flatnonzero((error>tolerance).any(axis=1))
+    first_divergence = int(exceeded[0]) if len(exceeded)>0 else None
+    max_error = {column:(float(error[:,i].max()) if num_steps>0 else 0.0) for i,column in enumerate(STATE_COLUMNS)}
+    return {"match":first_divergence is None and len(logged) == len(replayed),"logged_steps":len(logged),"replayed_steps":len(replayed),\
+            "max_error":max_error,"first_divergence":first_divergence}
+
+
+def replayRound(spec,header,cars,tolerance=DEFAULT_TOLERANCE):
+    """Replays a single recorded round of the scenario described by spec"""
+    replayer = Replayer(spec,params={field:header[field] for field in HEADER_FIELDS if field != "num_cars"},tolerance=tolerance)
+    try:
+        return replayer.replay(cars)
+    finally:
+        replayer.wrapUp()
+
+
+def replayResults(directory,specs,tolerance=DEFAULT_TOLERANCE):
+    """Lazily replays every results file in directory whose name prefix matches one of specs'
+       result_prefix. Yields (path,report) per round. One harness is built per scenario (and set
+       of header parameters) and reused for all of its rounds"""
+    prefixes = {spec.result_prefix:spec for spec in specs}
+    replayers = {}
+    try:
+        for path,header,cars in iterResults(directory):
+            spec = prefixes.get(parseResultName(path)["prefix"])
+            if spec is None:
+                continue
+            params = tuple([(field,header[field]) for field in HEADER_FIELDS if field != "num_cars"])
+            if (spec.name,params) not in replayers:
+                replayers[(spec.name,params)] = Replayer(spec,params=dict(params),tolerance=tolerance)
+            yield path,replayers[(spec.name,params)].replay(cars)
+    finally:
+        for replayer in replayers.values():
+            replayer.wrapUp()
+
+
+def loadScenario(path):
+    """The SCENARIO defined by an experiment's .py file"""
+    import importlib.util
+    module_spec = importlib.util.spec_from_file_location("replay_scenario_{}".format(abs(hash(path))),path)
+    module = importlib.util.module_from_spec(module_spec)
+    module_spec.loader.exec_module(module)
+    return module.SCENARIO
+
@@ -0,0 +1,153 @@
+import numpy as np
+import time
+
+
+class StepTimes():
+    """Wall-clock jitter of each fixed step of a round: how long after it was due (in seconds) the
+       step started. Written into a preallocated array that doubles when full, as TrajectoryLog"""
+    def __init__(self,capacity=1024):
+        self.jitter = np.empty(max(1,int(capacity)))
+        self.size = 0
+        self.slipped = 0 #steps dropped to catch up after falling too far behind
+
+
+    def append(self,value):
+        if self.size == self.jitter.shape[0]:
+            jitter = np.empty(2*self.jitter.shape[0])
+            jitter[:self.size] = self.jitter[:self.size]
+            self.jitter = jitter
+        self.jitter[self.size] = value
+        self.size += 1
+
+
+    def clear(self):
+        self.size = 0
+        self.slipped = 0
+
+
+    def view(self):
+        return self.jitter[:self.size]
+
+
+    def summary(self):
+        jitter = np.abs(self.view())
+        if len(jitter) == 0:
+            return {"steps":0,"slipped":self.slipped}
+        return {"steps":self.size,"slipped":self.slipped,"mean_abs_s":float(jitter.mean()),"p99_abs_s":float(np.percentile(jitter,99)),\
+                "max_abs_s":float(jitter.max())}
+
+
+class FixedStepScheduler():
+    """Runs a simulation step every dt seconds of wall time, whatever the rendering costs. Step n is
+       due at the start time plus n*dt; the time accumulated since the next step became due decides
+       how many steps to run before the next frame, so a slow frame delays the following steps
+       rather than stretching them. Rendering (with the window's input handling) runs in between at
+       up to frame_rate frames per second. Frames are not interpolated between steps: each shows
+       the state after the latest step, so at frame rates above 1/dt some frames repeat the last.
+       If more than max_steps_per_frame steps have built up, the excess is dropped and counted as
+       slipped rather than run in a burst. A render taking longer than pause_threshold (the
+       participant pausing the simulation) restarts the step timing from the end of the pause"""
+    def __init__(self,dt,frame_rate=30,max_steps_per_frame=5,pause_threshold=1.0,clock=time.perf_counter,sleep=time.sleep):
+        self.dt = dt
+        self.frame_interval = 1.0/frame_rate
+        self.max_steps_per_frame = max_steps_per_frame
+        self.pause_threshold = pause_threshold
+        self.clock = clock
+        self.sleep = sleep
+
+
+    def run(self,step,render,finished,step_times=None):
+        """Steps until finished() is True. The jitter of every step is appended to step_times"""
+        if step_times is None:
+            step_times = StepTimes()
+        dt,clock = self.dt,self.clock
+        due = next_frame = clock()
+
+        while not finished():
+            backlog = int((clock()-due)/dt)+1
+            if backlog>self.max_steps_per_frame:
+                slipped = backlog-self.max_steps_per_frame
+                step_times.slipped += slipped
+                due += slipped*dt
+
+            num_steps = 0
+            while num_steps<self.max_steps_per_frame and not finished():
+                start = clock()
+                if start<due:
+                    break
+                step_times.append(start-due)
+                step()
+                due += dt
+                num_steps += 1
+
+            now = clock()
+            if now>=next_frame and not finished():
+                render()
+                after = clock()
+                if after-now>self.pause_threshold:
+                    due = after
+                next_frame = max(next_frame+self.frame_interval,now)
+
+            wait = min(due,next_frame)-clock()
+            if wait>0:
+                self.sleep(wait)
+        return step_times
+
+
+class SimulatorStepper():
+    """Drives the simulator one step at a time for the fixed step scheduler. This relies on parts of
+       the simulator's API that runComplete hides, and these have not been checked against the
+       driving_simulator submodule:
+         - singleStep() advances every car (controllers, physics) and evaluates the triggers once,
+           drawing the frame as well while run_graphics is set
+         - the graphic simulator's update() draws the current state and handles the window's events
+           (including pausing)
+         - the simulator ends a run (a crash, a car reaching its destination, a trigger calling
+           Harness.endRound) through endSimulation()
+       The round ends when endSimulation or end() is called, or after max_steps steps (the
+       simulator's runtime). An end the simulator records some other way is not seen, and the
+       round then runs on to max_steps, so until these are checked the fixed step mode should not
+       be taken to run a round as runComplete does"""
+    def __init__(self,sim,max_steps):
+        for owner,attribute in ((sim,"singleStep"),(sim,"run_graphics"),(sim,"endSimulation"),(sim.g_sim,"update")):
+            if not hasattr(owner,attribute):
+                print("Error, the fixed step mode needs the simulator to provide {}.{}".format(type(owner).__name__,attribute))
+                exit(-1)
+        self.sim = sim
+        self.max_steps = max_steps
+        self.num_steps = 0
+        self.ended = False
+
+        #Every end of the run, whoever asks for it, ends the round
+        end_simulation = sim.endSimulation
+        def endSimulation(*args,**kwargs):
+            self.end()
+            return end_simulation(*args,**kwargs)
+        sim.endSimulation = endSimulation
+
+
+    def start(self):
+        self.num_steps = 0
+        self.ended = False
+
+
+    def step(self):
+        run_graphics = self.sim.run_graphics
+        self.sim.run_graphics = False
+        try:
+            self.sim.singleStep()
+        finally:
+            self.sim.run_graphics = run_graphics
+        self.num_steps += 1
+
+
+    def render(self):
+        self.sim.g_sim.update()
+
+
+    def end(self):
+        self.ended = True
+
+
+    def finished(self):
+        return self.ended or self.num_steps>=self.max_steps
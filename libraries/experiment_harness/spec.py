@@ -0,0 +1,96 @@
+import itertools
+import random
+
+#Parameters shared by every experiment unless a scenario overrides them
+DEFAULT_PARAMS = {
+    #Vehicle Dimensions
+    "lane_width":5,
+    "veh_length":4.6,
+    "veh_width":2,
+    "axle_length":2.72,
+    #Dynamics Parameters
+    "accel_jerk":3,
+    "yaw_rate_jerk":10,
+    "dt":.1,
+    "speed_limit":5.5,
+    "participant_accel_range":[-3,3],
+    "accel_range":[-3,3],
+    "yaw_rate_range":[-10,10], # degree per second^2
+    #Graphics
+    "window":(1200,800),
+    "font_size":25,
+    "space_size":10,
+    #"simulator" leaves the timing of steps and frames to the simulator; "fixed" runs steps at exactly
+    # dt on the wall clock, with frames drawn in between at up to frame_rate. "fixed" steps the
+    # simulator through calls not yet checked against it (see scheduler.SimulatorStepper)
+    "step_mode":"simulator",
+    "frame_rate":30,
+}
+
+
+class RoadSpec():
+    """A straight road made of len(lengths) consecutive road segments joined end to end"""
+    def __init__(self,lengths,angles=None,runtime=120.0,draw_traj=False):
+        self.lengths = list(lengths)
+        self.angles = list(angles) if angles is not None else [0 for _ in self.lengths]
+        self.num_junctions = len(self.lengths)+1
+        self.junc_pairs = [(i,i+1) for i in range(len(self.lengths))]
+        self.runtime = runtime #max runtime; simulation will terminate if run exceeds this length of time
+        self.draw_traj = draw_traj #trajectories are uninteresting by deafault
+
+
+class CarSpec():
+    """One car in the scenario. start and dest are [(junction,junction),lane] as the simulator
+       expects. The ego car is the participant's (or the driver's) car.
+       label and type_index say how the car is written to the results: under which heading, with
+       its type taken from that entry of each round's tuple in the experiment order"""
+    def __init__(self,name,start,dest,init_speed,ego=False,reverse_heading=False,label=None,type_index=None):
+        self.name = name
+        self.start = start
+        self.dest = dest
+        self.init_speed = init_speed
+        self.ego = ego
+        self.reverse_heading = reverse_heading
+        self.label = label
+        self.type_index = type_index
+
+
+class ScenarioSpec():
+    """Everything that distinguishes one experiment from another.
+         - cars: CarSpecs in the order they are loaded into the simulator
+         - setup(harness): builds the non-ego controllers and the triggers that hold for every round
+         - setup_round(harness,round_types): anything that depends on the round, called before the
+           simulator is reset for the round
+         - directive(round_types): the task text shown for the round, or None
+         - round_types, num_observations: the rounds making up the experiment (see experimentOrder).
+           If round_types is None rounds repeat until the window is closed
+         - data_address, result_prefix: where results are written. No results are kept if
+           data_address is None
+         - record_order: names of the cars in the order they are written to the results
+         - params: overrides of DEFAULT_PARAMS"""
+    def __init__(self,name,road,cars,setup=None,setup_round=None,directive=None,round_label="Round: {}/{}",\
+                 round_types=None,num_observations=1,data_address=None,result_prefix=None,record_order=None,params=None):
+        self.name = name
+        self.road = road
+        self.cars = cars
+        self.setup = setup
+        self.setup_round = setup_round
+        self.directive = directive
+        self.round_label = round_label
+        self.round_types = round_types
+        self.num_observations = num_observations
+        self.data_address = data_address
+        self.result_prefix = result_prefix
+        self.record_order = record_order if record_order is not None else [car.name for car in cars if car.label is not None]
+
+        self.params = dict(DEFAULT_PARAMS)
+        if params is not None:
+            self.params.update(params)
+
+
+def experimentOrder(spec):
+    """A randomly ordered list with every round type repeated num_observations times"""
+    if spec.round_types is None:
+        return itertools.repeat(())
+    experiment_types = list(spec.round_types)*spec.num_observations
+    return random.sample(experiment_types,len(experiment_types))
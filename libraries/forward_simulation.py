@@ -0,0 +1,127 @@
+"""Batched open-loop rollouts of logged actions, for what-if studies over many rounds at once.
+   The results are approximate. The model (below) is the bicycle model LaneChangeTrajectory.action
+   inverts, and the simulator's own vehicle_classes Car.move may differ from it in update order
+   and in how it treats yaw_rate. Every logged state was produced by Car.move, so checkRound and
+   checkResults compare the model against recorded rounds; run them on a results directory before
+   relying on the rollouts. Use experiment_harness.Replayer where the states have to match the
+   simulator's.
+        python3 forward_simulation.py <results directory> [axle_length]"""
+import numpy as np
+import sys
+
+from experiment_harness.replay import DEFAULT_TOLERANCE,compareStates
+from result_io import STATE_COLUMNS
+from result_loader import iterResults
+
+X,Y,VELOCITY,HEADING = [STATE_COLUMNS.index(x) for x in ("x","y","velocity","heading")]
+
+
+def forwardSimulate(init_states,actions,dt,axle_length):
+    """Integrates N sequences of T (accel,yaw_rate) actions at once under the bicycle model that
+       LaneChangeTrajectory.action inverts: the yaw_rate entry is the steering angle, so the heading
+       changes at velocity*tan(yaw_rate)/axle_length. Angles are in radians and states are
+       (x,y,velocity,heading), as in the results files; y points down the screen, as in the simulator.
+       init_states is (N,4) (or (4,) for every sequence) and actions (N,T,2); dt and axle_length are
+       scalars or one per sequence. Returns (N,T+1,4) states. Row k is the state action k was taken
+       in, so rows 0 to T-1 line up with the logged States of the round the actions came from.
+       Each step is an explicit Euler step from the state at its start:
+           x += v*cos(heading)*dt, y -= v*sin(heading)*dt, v += accel*dt,
+           heading += v*tan(yaw_rate)/axle_length*dt
+       Every channel is a running sum over time, so the whole batch is a handful of accumulations
+       along T, with the terms added in the same order as stepping one car at a time"""
+    actions = np.asarray(actions,dtype=float)
+    if actions.ndim == 2:
+        actions = actions[None]
+    num_sequences,num_steps,_ = actions.shape
+    init_states = np.broadcast_to(np.asarray(init_states,dtype=float),(num_sequences,len(STATE_COLUMNS)))
+    dt = np.reshape(np.asarray(dt,dtype=float),(-1,1))
+    axle_length = np.reshape(np.asarray(axle_length,dtype=float),(-1,1))
+
+    states = np.empty((num_sequences,num_steps+1,len(STATE_COLUMNS)))
+    #Each channel starts from its initial value and accumulates one increment per step
+    velocity = states[:,:,VELOCITY]
+    velocity[:,0] = init_states[:,VELOCITY]
+    velocity[:,1:] = actions[:,:,0]*dt
+    np.add.accumulate(velocity,axis=1,out=velocity)
+
+    heading = states[:,:,HEADING]
+    heading[:,0] = init_states[:,HEADING]
+    heading[:,1:] = velocity[:,:-1]*np.tan(actions[:,:,1])/axle_length*dt
+    np.add.accumulate(heading,axis=1,out=heading)
+
+    x = states[:,:,X]
+    x[:,0] = init_states[:,X]
+    x[:,1:] = velocity[:,:-1]*np.cos(heading[:,:-1])*dt
+    np.add.accumulate(x,axis=1,out=x)
+
+    y = states[:,:,Y]
+    y[:,0] = init_states[:,Y]
+    y[:,1:] = -velocity[:,:-1]*np.sin(heading[:,:-1])*dt
+    np.add.accumulate(y,axis=1,out=y)
+
+    #Headings are reported in [0,2pi), as the simulator keeps them in [0,360)
+    np.mod(heading,2*np.pi,out=heading)
+    return states
+
+
+def stackActions(action_list):
+    """Stacks action sequences of different lengths into one (N,T,2) array, T being the longest,
+       for forwardSimulate. Shorter sequences are padded with (0,0), which only affects the states
+       after their end. Returns the array and the length of each sequence"""
+    lengths = np.array([len(x) for x in action_list],dtype=int)
+    actions = np.zeros((len(action_list),lengths.max() if len(lengths)>0 else 0,2))
+    for i,sequence in enumerate(action_list):
+        actions[i,:lengths[i]] = np.asarray(sequence,dtype=float).reshape(-1,2)
+    return actions,lengths
+
+
+def forwardSimulateRounds(rounds,car_index,axle_length,perturb=None):
+    """The states implied by one car's logged actions in every round of rounds, a list of
+       (header,cars) as returned by result_loader.loadResults. Each round starts from the car's
+       first logged state and uses the round's dt. perturb, if given, maps the stacked (N,T,2)
+       actions to the actions to simulate instead (for what-if studies).
+       Returns a list of (len(actions)+1,4) state arrays, one per round"""
+    action_list = [cars[car_index]["actions"] for _,cars in rounds]
+    actions,lengths = stackActions(action_list)
+    if perturb is not None:
+        actions = perturb(actions)
+    init_states = np.array([np.asarray(cars[car_index]["states"],dtype=float).reshape(-1,len(STATE_COLUMNS))[0] for _,cars in rounds])
+    dt = np.array([header["dt"] for header,_ in rounds],dtype=float)
+    states = forwardSimulate(init_states,actions,dt,axle_length)
+    return [states[i,:lengths[i]+1] for i in range(len(rounds))]
+
+
+def checkRound(header,cars,axle_length,tolerance=DEFAULT_TOLERANCE):
+    """Rolls each car's logged actions forward from its first logged state and compares the result
+       with the states the simulator logged (see experiment_harness.compareStates). Returns one
+       comparison per car"""
+    report = []
+    for car_index,car in enumerate(cars):
+        logged = np.asarray(car["states"],dtype=float).reshape(-1,len(STATE_COLUMNS))
+        if len(logged) == 0:
+            report.append(compareStates(logged,logged,tolerance))
+            continue
+        states = forwardSimulateRounds([(header,cars)],car_index,axle_length)[0]
+        report.append(compareStates(logged,states[:len(logged)],tolerance))
+    return report
+
+
+def checkResults(directory,axle_length,tolerance=DEFAULT_TOLERANCE):
+    """Lazily yields (path,report) from checkRound for every results file in directory"""
+    for path,header,cars in iterResults(directory,mmap=False):
+        yield path,checkRound(header,cars,axle_length,tolerance)
+
+
+if __name__ == "__main__":
+    from experiment_harness.spec import DEFAULT_PARAMS
+    axle_length = float(sys.argv[2]) if len(sys.argv)>2 else DEFAULT_PARAMS["axle_length"]
+    num_cars,mismatches = 0,0
+    for path,report in checkResults(sys.argv[1],axle_length):
+        for car_index,comparison in enumerate(report):
+            num_cars += 1
+            if not comparison["match"]:
+                mismatches += 1
+                print("{} car {}: diverged at step {}, max error {}".format(path,car_index,comparison["first_divergence"],comparison["max_error"]))
+    print("Checked {} car trajectories, {} did not match the simulator's".format(num_cars,mismatches))
+    if mismatches:
+        exit(1)
@@ -0,0 +1,96 @@
+import json
+import time
+
+
+class Instrumentation():
+    """Opt-in timers and counters for the per-tick hot paths of a run: trigger predicates and
+       consequents, controller selectAction calls, the text overlay and result writes.
+       Nothing is timed unless an Instrumentation is handed to the Harness, which then wraps those
+       callables with wrap/wrapTrigger; without one the original callables are registered
+       unchanged, so a normal run pays nothing for this.
+       Times are inclusive (a consequent that switches controller includes the switch). Call
+       startRound and endRound around each round; endRound returns that round's summary and keeps
+       it in rounds"""
+    def __init__(self,clock=time.perf_counter):
+        self.clock = clock
+        self.sites = {} #(category,name) -> [count,total time,longest time] for the current round
+        self.fired = [] #(trigger name,step,seconds into the round) for the current round
+        self.rounds = []
+        self.round = None
+        self.round_start = None
+        #Returns the number of steps run so far this round, to say when each trigger fired
+        self.step = lambda: None
+
+
+    def wrap(self,category,name,func):
+        """Returns func timed and counted under (category,name)"""
+        stats = self.sites.setdefault((category,name),[0,0.0,0.0])
+        clock = self.clock
+
+        def timed(*args,**kwargs):
+            start = clock()
+            try:
+                return func(*args,**kwargs)
+            finally:
+                elapsed = clock()-start
+                stats[0] += 1
+                stats[1] += elapsed
+                if elapsed>stats[2]: stats[2] = elapsed
+
+        timed.__wrapped__ = func
+        return timed
+
+
+    def wrapTrigger(self,name,trigger,consequent):
+        """Times the trigger's predicate under "triggers" and its consequent under "consequents",
+           and records each time the consequent fires. Returns the wrapped (trigger,consequent)"""
+        timed_consequent = self.wrap("consequents",name,consequent)
+        fired = self.fired
+        clock = self.clock
+
+        def fire(*args,**kwargs):
+            fired.append((name,self.step(),clock()-self.round_start))
+            return timed_consequent(*args,**kwargs)
+
+        fire.__wrapped__ = consequent
+        return self.wrap("triggers",name,trigger),fire
+
+
+    def startRound(self,i):
+        for stats in self.sites.values():
+            stats[:] = [0,0.0,0.0]
+        #Cleared in place; the trigger wrappers hold on to the list
+        del self.fired[:]
+        self.round = i
+        self.round_start = self.clock()
+
+
+    def endRound(self):
+        """Summary of the round: its number, wall time, steps run, which triggers fired when and,
+           per category and name, the call count and total, mean and longest time in seconds"""
+        summary = {"round":self.round,"time_s":self.clock()-self.round_start,"steps":self.step(),"fired":list(self.fired),"sites":{}}
+        for (category,name),(count,total,longest) in sorted(self.sites.items()):
+            if count>0:
+                summary["sites"].setdefault(category,{})[name] = {"count":count,"total_s":total,"mean_s":total/count,"max_s":longest}
+        self.rounds.append(summary)
+        return summary
+
+
+    def writeSummaries(self,path):
+        """Writes the summary of every round so far to path, one JSON object per line"""
+        output = open(path,"w")
+        for summary in self.rounds:
+            output.write(json.dumps(summary)+"\n")
+        output.close()
+
+
+def formatSummary(summary):
+    """The round summary as lines of text, slowest categories' sites first"""
+    lines = ["Round {}: {:.3f}s, {} steps".format(summary["round"],summary["time_s"],summary["steps"])]
+    for category,sites in summary["sites"].items():
+        for name,stats in sorted(sites.items(),key=lambda x: -x[1]["total_s"]):
+            lines.append("  {}/{}: {} calls, {:.2f}ms total, {:.1f}us mean, {:.1f}us max".format(category,name,stats["count"],\
+                                        1e3*stats["total_s"],1e6*stats["mean_s"],1e6*stats["max_s"]))
+    for name,step,seconds in summary["fired"]:
+        lines.append("  fired {} at step {} ({:.3f}s)".format(name,step,seconds))
+    return lines
@@ -0,0 +1,41 @@
+import concurrent.futures
+import datetime
+import math
+import os
+
+
+def shardOrder(experiment_order,num_shards):
+    """Splits experiment_order into at most num_shards contiguous pieces of near equal size.
+       Returns a list of (round_offset,rounds) pairs, empty if there are no rounds"""
+    if len(experiment_order) == 0:
+        return []
+    num_shards = max(1,min(num_shards,len(experiment_order)))
+    shard_size = int(math.ceil(len(experiment_order)/num_shards))
+    return [(i,experiment_order[i:i+shard_size]) for i in range(0,len(experiment_order),shard_size)]
+
+
+def runParallel(run_experiment,experiment_order,num_workers=None,rounds_per_shard=None,**kwargs):
+    """Runs the rounds in experiment_order headlessly across a pool of worker processes.
+       run_experiment is an experiment's runExperiment function. Each shard of rounds is run in
+       its own process, which builds its own simulator and cars. All shards share one start time
+       and are given their global round offset, so the result files are named exactly as a
+       sequential run would name them. Any other keyword arguments (e.g. driver, which must be
+       picklable) are passed to run_experiment. Returns the shared start time"""
+    if num_workers is None:
+        num_workers = os.cpu_count() or 1
+    if rounds_per_shard is None:
+        num_shards = num_workers
+    else:
+        num_shards = int(math.ceil(len(experiment_order)/rounds_per_shard))
+
+    exp_start_time = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    shards = shardOrder(list(experiment_order),num_shards)
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=num_workers) as pool:
+        futures = [pool.submit(run_experiment,rounds,headless=True,exp_start_time=exp_start_time,round_offset=offset,\
+                                num_rounds=len(experiment_order),**kwargs) for offset,rounds in shards]
+        #result() re-raises any exception from the worker
+        for future in futures:
+            future.result()
+
+    return exp_start_time
@@ -0,0 +1,20 @@
+import os
+import sys
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.abspath(__file__)),"driving_simulator"))
+
+from experiment_harness.replay import loadScenario,replayResults
+
+if __name__ == "__main__":
+    #python3 replay_results.py <results directory> <experiment .py file> [<experiment .py file> ...]
+    #Replays every round in the directory and reports any whose replayed states do not match the logged ones
+    num_rounds,mismatches = 0,0
+    for path,report in replayResults(sys.argv[1],[loadScenario(x) for x in sys.argv[2:]]):
+        num_rounds += 1
+        for name,comparison in report.items():
+            if not comparison["match"]:
+                mismatches += 1
+                print("{} {}: diverged at step {} ({} logged, {} replayed steps), max error {}".format(path,name,comparison["first_divergence"],\
+                        comparison["logged_steps"],comparison["replayed_steps"],comparison["max_error"]))
+    print("Replayed {} rounds, {} car trajectories did not match".format(num_rounds,mismatches))
+    if mismatches:
+        exit(1)
@@ -0,0 +1,187 @@
+import json
+import lzma
+import numpy as np
+import os
+import struct
+import sys
+import zlib
+
+from result_io import RESULT_EXTENSIONS,decodeBinaryResults,encodeBinaryResults,writeResults
+from result_loader import listResults,loadResults,parseResultName
+
+ARCHIVE_MAGIC = b"CDCARC1\n"
+#Last bytes of an archive: little-endian uint64 offset of the JSON footer, then ARCHIVE_MAGIC
+ARCHIVE_TAIL = struct.Struct("<Q")
+
+CODECS = {"zlib":(lambda data,level: zlib.compress(data,6 if level is None else level),zlib.decompress),\
+          "lzma":(lambda data,level: lzma.compress(data,preset=6 if level is None else level),lzma.decompress)}
+
+
+def _shuffle(data):
+    """Groups the bytes of consecutive float64s by significance (all first bytes, then all second
+       bytes, ...). Neighbouring samples of a trajectory share their high bytes, so this compresses
+       much better. Every round is a multiple of BINARY_ALIGNMENT bytes, so len(data)%8 == 0"""
+    return np.frombuffer(data,dtype=np.uint8).reshape(-1,8).T.tobytes()
+
+
+def _unshuffle(data):
+    return np.frombuffer(data,dtype=np.uint8).reshape(8,-1).T.tobytes()
+
+
+class ArchiveWriter():
+    """Writes rounds to a single compressed archive file. Each round is stored in the binary results
+       format (see result_io.encodeBinaryResults); rounds are gathered into chunks of about
+       chunk_size bytes, byte-shuffled and compressed independently with codec ("zlib" or "lzma").
+       A JSON footer indexes every round by name, experiment, start time and round, so any one round
+       can be read by decompressing only its chunk (see ResultArchive)"""
+    def __init__(self,path,codec="zlib",chunk_size=1<<20,level=None):
+        if codec not in CODECS:
+            print("Error, unknown codec '{}'. Options are {}".format(codec,list(CODECS)))
+            exit(-1)
+        self.archive = open(path,"wb")
+        self.archive.write(ARCHIVE_MAGIC)
+        self.codec = codec
+        self.level = level
+        self.chunk_size = chunk_size
+
+        self.chunks = []
+        self.rounds = []
+        self.pending = [] #encoded rounds not yet in a chunk
+        self.pending_size = 0
+
+
+    def add(self,name,header,cars):
+        """Adds a round under name (e.g. its results file path relative to the results directory)"""
+        data = encodeBinaryResults(header,cars)
+        record = {"name":name,"chunk":len(self.chunks),"offset":self.pending_size,"length":len(data)}
+        result_name = parseResultName(name)
+        if result_name is not None:
+            for key in ("experiment","start_time","round"):
+                record[key] = result_name[key]
+            record["format"] = result_name["extension"]
+        self.rounds.append(record)
+
+        self.pending.append(data)
+        self.pending_size += len(data)
+        if self.pending_size>=self.chunk_size:
+            self._writeChunk()
+
+
+    def _writeChunk(self):
+        if not self.pending:
+            return
+        compress = CODECS[self.codec][0]
+        data = compress(_shuffle(b"".join(self.pending)),self.level)
+        self.chunks.append({"offset":self.archive.tell(),"length":len(data),"raw_length":self.pending_size,"codec":self.codec})
+        self.archive.write(data)
+        self.pending = []
+        self.pending_size = 0
+
+
+    def close(self):
+        self._writeChunk()
+        footer_offset = self.archive.tell()
+        self.archive.write(json.dumps({"chunks":self.chunks,"rounds":self.rounds}).encode("utf-8"))
+        self.archive.write(ARCHIVE_TAIL.pack(footer_offset))
+        self.archive.write(ARCHIVE_MAGIC)
+        self.archive.close()
+
+
+class ResultArchive():
+    """Read access to an archive written by ArchiveWriter. Only the footer is read on opening; a
+       round is loaded by reading and decompressing its chunk alone. The most recently decompressed
+       chunk is kept, so reading the rounds in order decompresses each chunk once"""
+    def __init__(self,path):
+        self.path = path
+        archive = open(path,"rb")
+        if archive.read(len(ARCHIVE_MAGIC)) != ARCHIVE_MAGIC:
+            archive.close()
+            raise ValueError("{} is not a results archive".format(path))
+        archive.seek(-(ARCHIVE_TAIL.size+len(ARCHIVE_MAGIC)),os.SEEK_END)
+        footer_offset = ARCHIVE_TAIL.unpack(archive.read(ARCHIVE_TAIL.size))[0]
+        footer_end = archive.tell()-ARCHIVE_TAIL.size
+        archive.seek(footer_offset)
+        footer = json.loads(archive.read(footer_end-footer_offset).decode("utf-8"))
+        archive.close()
+
+        self.chunks = footer["chunks"]
+        self.rounds = footer["rounds"]
+        self.names = {record["name"]:record for record in self.rounds}
+        self.cached_chunk = (None,None)
+
+
+    def query(self,**conditions):
+        """Records of the rounds matching every condition, in the order they were archived. As in
+           ResultIndex.query, each condition is a field (name, experiment, start_time, round, format)
+           with either the required value or a function of the value returning True for a match"""
+        matches = []
+        for record in self.rounds:
+            for field,condition in conditions.items():
+                value = record.get(field)
+                if callable(condition):
+                    if not condition(value): break
+                elif value != condition:
+                    break
+            else:
+                matches.append(record)
+        return matches
+
+
+    def _chunk(self,index):
+        if self.cached_chunk[0] != index:
+            chunk = self.chunks[index]
+            archive = open(self.path,"rb")
+            archive.seek(chunk["offset"])
+            data = archive.read(chunk["length"])
+            archive.close()
+            self.cached_chunk = (index,_unshuffle(CODECS[chunk["codec"]][1](data)))
+        return self.cached_chunk[1]
+
+
+    def load(self,record):
+        """Returns (header,cars) for a round, given its record or name, as result_io.loadBinaryResults
+           would. The arrays are read-only"""
+        if not isinstance(record,dict):
+            record = self.names[record]
+        data = memoryview(self._chunk(record["chunk"]))[record["offset"]:record["offset"]+record["length"]]
+        return decodeBinaryResults(data)
+
+
+    def loadRounds(self,**conditions):
+        """Lazily yields (record,header,cars) for the matching rounds"""
+        for record in self.query(**conditions):
+            header,cars = self.load(record)
+            yield record,header,cars
+
+
+    def extract(self,directory,result_format=None,**conditions):
+        """Writes the matching rounds back out as results files under directory, at their archived
+           names. By default each round is written in the format it was archived from"""
+        for record,header,cars in self.loadRounds(**conditions):
+            address,extension = os.path.splitext(os.path.join(directory,record["name"]))
+            round_format = result_format
+            if round_format is None:
+                round_format = {value:key for key,value in RESULT_EXTENSIONS.items()}.get(extension[1:],"binary")
+            os.makedirs(os.path.dirname(address),exist_ok=True)
+            writeResults(address,header,cars,round_format)
+
+
+def archiveResults(directory,path,codec="zlib",chunk_size=1<<20,level=None):
+    """Archives every results file (text or binary) anywhere under directory into a single archive
+       at path. Rounds are named by their path relative to directory. Returns the number of rounds"""
+    writer = ArchiveWriter(path,codec=codec,chunk_size=chunk_size,level=level)
+    num_rounds = 0
+    for root,dirs,_ in os.walk(directory):
+        dirs.sort()
+        for results_path in listResults(root):
+            header,cars = loadResults(results_path,mmap=False)
+            writer.add(os.path.relpath(results_path,directory),header,cars)
+            num_rounds += 1
+    writer.close()
+    return num_rounds
+
+
+if __name__ == "__main__":
+    #python3 result_archive.py <results directory> <archive path> [codec]
+    num_rounds = archiveResults(sys.argv[1],sys.argv[2],*sys.argv[3:4])
+    print("Archived {} rounds to {}".format(num_rounds,sys.argv[2]))
@@ -0,0 +1,127 @@
+import json
+import os
+
+from result_loader import listResults,loadResults,parseResultName
+from result_io import loadBinaryResults
+
+INDEX_NAME = "index.jsonl"
+
+
+def roundRecord(path,cars):
+    """Index entry for the round stored at path. cars are the car dictionaries written to (or
+       read from) the file; only their metadata and the length of their states are used"""
+    name = parseResultName(path)
+    record = {"path":os.path.basename(path),"experiment":name["experiment"],"start_time":name["start_time"],\
+              "round":name["round"],"format":name["extension"]}
+    for prefix,car in zip(("ego","other"),cars):
+        record[prefix+"_type"] = car["type"]
+        record[prefix+"_on_road"] = int(car["on_road"])
+        record[prefix+"_crash"] = int(car["crash"])
+        record[prefix+"_num_steps"] = len(car["states"])
+    return record
+
+
+def summariseFile(path):
+    """Builds the index entry for an existing results file without parsing its trajectories"""
+    if path.endswith(".bin"):
+        #Memory-mapped, so the trajectory blocks are never read
+        _,cars = loadBinaryResults(path,mmap=True)
+    else:
+        cars = []
+        results = open(path,"r")
+        for line in results:
+            if line.startswith("Type: "):
+                cars.append({"type":line[len("Type: "):].rstrip("\n")})
+            elif line.startswith("On Road: "):
+                cars[-1]["on_road"] = int(line[len("On Road: "):])
+            elif line.startswith("Crash: "):
+                cars[-1]["crash"] = int(line[len("Crash: "):])
+            elif line.startswith("States: "):
+                #Only the length is needed, so count tuples rather than parse them
+                cars[-1]["states"] = range(line.count("("))
+        results.close()
+    return roundRecord(path,cars)
+
+
+def indexRound(path,cars):
+    """Appends the round just written at path to the index in its directory"""
+    ResultIndex(os.path.dirname(path)).add(roundRecord(path,cars))
+
+
+class ResultIndex():
+    """Per-round metadata for a results directory, stored as one JSON record per line in
+       INDEX_NAME. Queries only read the index, never the results files themselves"""
+    def __init__(self,directory):
+        self.directory = directory
+        self.index_path = os.path.join(directory,INDEX_NAME)
+        self.records = None
+
+
+    def load(self):
+        """Reads the index file. Later entries for the same file replace earlier ones"""
+        records = {}
+        if os.path.exists(self.index_path):
+            index_file = open(self.index_path,"r")
+            for line in index_file:
+                if line.strip():
+                    record = json.loads(line)
+                    records[record["path"]] = record
+            index_file.close()
+        self.records = records
+        return self
+
+
+    def add(self,record):
+        #A single short append per round, so concurrent writers (see parallel_runner) do not interleave
+        index_file = open(self.index_path,"a")
+        index_file.write(json.dumps(record)+"\n")
+        index_file.close()
+        if self.records is not None:
+            self.records[record["path"]] = record
+
+
+    def update(self):
+        """Indexes any results files in the directory that are not in the index yet"""
+        if self.records is None: self.load()
+        for path in listResults(self.directory):
+            if os.path.basename(path) not in self.records:
+                self.add(summariseFile(path))
+        return self
+
+
+    def rebuild(self):
+        """Discards the index and rebuilds it from the results files"""
+        if os.path.exists(self.index_path):
+            os.remove(self.index_path)
+        self.records = {}
+        return self.update()
+
+
+    def query(self,**conditions):
+        """Returns the records matching every condition, ordered by start time then round. Each condition
+           is a record field (e.g. experiment="exp1b", ego_type="aggressive", other_crash=0) with either
+           the required value or a function of the value returning True for a match"""
+        if self.records is None: self.load()
+        matches = []
+        for record in self.records.values():
+            for field,condition in conditions.items():
+                value = record.get(field)
+                if callable(condition):
+                    if not condition(value): break
+                elif value != condition:
+                    break
+            else:
+                matches.append(record)
+        return sorted(matches,key=lambda x: (x["start_time"],x["round"]))
+
+
+    def paths(self,**conditions):
+        return [os.path.join(self.directory,record["path"]) for record in self.query(**conditions)]
+
+
+    def loadRounds(self,mmap=True,**conditions):
+        """Lazily yields (record,header,cars) for the matching rounds. Binary files are memory-mapped,
+           so their trajectories are array views read only when accessed"""
+        for record in self.query(**conditions):
+            header,cars = loadResults(os.path.join(self.directory,record["path"]),mmap=mmap)
+            yield record,header,cars
@@ -0,0 +1,182 @@
+import json
+import numpy as np
+import os
+import struct
+
+#Header fields written at the top of every results file, in order
+HEADER_FIELDS = ["num_cars","lane_width","veh_length","veh_width","dt","speed_limit"]
+
+#Per-timestep channels stored for each car. The first four make up "States" and the last
+# two "Actions" in the text format
+STATE_COLUMNS = ["x","y","velocity","heading"]
+ACTION_COLUMNS = ["acceleration","yaw_rate"]
+
+BINARY_MAGIC = b"CDCRES1\n"
+BINARY_ALIGNMENT = 64
+
+RESULT_EXTENSIONS = {"text":"txt","binary":"bin"}
+
+
+def carRecord(label,car_type,car,states,actions):
+    """Bundles everything written for one car. states are (x,y,v,heading) tuples and
+       actions (accel,yaw_rate) tuples (or (N,4) and (N,2) arrays), both with angles in radians"""
+    return {"label":label,"type":car_type,"on_road":int(car.on_road),"crash":int(car.crashed),"states":states,"actions":actions}
+
+
+def writeResults(address,header,cars,result_format="text",fsync=False):
+    """Writes one round of results to address (without extension) in the given format
+       ("text" or "binary"). With fsync the file is forced to disk before returning.
+       Returns the path written"""
+    if result_format not in RESULT_EXTENSIONS:
+        print("Error, unknown result format '{}'. Options are {}".format(result_format,list(RESULT_EXTENSIONS)))
+        exit(-1)
+
+    path = "{}.{}".format(address,RESULT_EXTENSIONS[result_format])
+    if result_format == "text":
+        writeTextResults(path,header,cars,fsync)
+    else:
+        writeBinaryResults(path,header,cars,fsync)
+    return path
+
+
+def writeTextResults(path,header,cars,fsync=False):
+    """The original human-readable format"""
+    results = open(path,"w")
+    for field in HEADER_FIELDS:
+        results.write("{}: {}\n".format(field,header[field]))
+
+    #Behaviour being modelled/learnt put in first, behaviour of all other cars goes after
+    for car in cars:
+        results.write("\n{}\n".format(car["label"]))
+        results.write("Type: {}\n".format(car["type"]))
+        results.write("On Road: {}\n".format(car["on_road"]))
+        results.write("Crash: {}\n".format(car["crash"]))
+        results.write("States: {}\n".format(_tupleList(car["states"])))
+        results.write("Actions: {}\n".format(_tupleList(car["actions"])))
+    _close(results,fsync)
+
+
+def writeBinaryResults(path,header,cars,fsync=False):
+    """Fixed layout float64 format (see encodeBinaryResults)"""
+    results = open(path,"wb")
+    results.write(encodeBinaryResults(header,cars))
+    _close(results,fsync)
+
+
+def encodeBinaryResults(header,cars):
+    """The bytes of a binary results file. These are:
+         - BINARY_MAGIC
+         - little-endian uint32 length of a JSON header, then the header itself, padded so the
+           data starts on a BINARY_ALIGNMENT byte boundary
+         - for each car a (len(STATE_COLUMNS)+len(ACTION_COLUMNS),num_steps) little-endian float64
+           block, one contiguous column per channel
+       The JSON header holds the header fields, the column names and for each car its label,
+       type, on road and crash flags, number of steps and the byte offset of its block"""
+    columns = STATE_COLUMNS+ACTION_COLUMNS
+    blocks = []
+    for car in cars:
+        block = np.empty((len(columns),len(car["states"])),dtype="<f8")
+        if len(car["states"])>0:
+            block[:len(STATE_COLUMNS)] = np.asarray(car["states"],dtype=float).T
+            block[len(STATE_COLUMNS):] = np.asarray(car["actions"],dtype=float).T
+        blocks.append(block)
+
+    meta = {field:header[field] for field in HEADER_FIELDS}
+    meta["columns"] = columns
+    meta["cars"] = [{"label":car["label"],"type":car["type"],"on_road":car["on_road"],"crash":car["crash"],\
+                     "num_steps":block.shape[1]} for car,block in zip(cars,blocks)]
+
+    #Offsets depend on the header length, which depends on the offsets, so size the header
+    # with placeholder offsets wide enough for any file we would write
+    for car_meta in meta["cars"]:
+        car_meta["offset"] = 10**12
+    header_len = len(json.dumps(meta).encode("utf-8"))
+    data_start = _align(len(BINARY_MAGIC)+4+header_len)
+
+    offset = data_start
+    for car_meta,block in zip(meta["cars"],blocks):
+        car_meta["offset"] = offset
+        offset += _align(block.nbytes)
+    header_bytes = json.dumps(meta).encode("utf-8")
+    header_bytes += b" "*(data_start-len(BINARY_MAGIC)-4-len(header_bytes))
+
+    parts = [BINARY_MAGIC,struct.pack("<I",len(header_bytes)),header_bytes]
+    for block in blocks:
+        parts.append(block.tobytes())
+        parts.append(b"\0"*(_align(block.nbytes)-block.nbytes))
+    return b"".join(parts)
+
+
+def loadBinaryResults(path,mmap=True):
+    """Reads a file written by writeBinaryResults. Returns the header dictionary and a list of
+       car dictionaries as in carRecord, with "states" an (N,4) and "actions" an (N,2) array.
+       With mmap the arrays are read-only views onto the memory-mapped file"""
+    results = open(path,"rb")
+    if results.read(len(BINARY_MAGIC)) != BINARY_MAGIC:
+        results.close()
+        raise ValueError("{} is not a binary results file".format(path))
+    header_len = struct.unpack("<I",results.read(4))[0]
+    meta = json.loads(results.read(header_len).decode("utf-8"))
+    results.close()
+
+    def readBlock(offset,shape):
+        if mmap:
+            return np.memmap(path,dtype="<f8",mode="r",offset=offset,shape=shape)
+        return np.fromfile(path,dtype="<f8",count=shape[0]*shape[1],offset=offset).reshape(shape)
+
+    return _decodeMeta(meta,readBlock)
+
+
+def decodeBinaryResults(data):
+    """As loadBinaryResults, for the bytes of a binary results file (see encodeBinaryResults). The
+       arrays are read-only views onto data"""
+    if bytes(data[:len(BINARY_MAGIC)]) != BINARY_MAGIC:
+        raise ValueError("Data is not in the binary results format")
+    header_len = struct.unpack_from("<I",data,len(BINARY_MAGIC))[0]
+    meta_start = len(BINARY_MAGIC)+4
+    meta = json.loads(bytes(data[meta_start:meta_start+header_len]).decode("utf-8"))
+
+    def readBlock(offset,shape):
+        return np.frombuffer(data,dtype="<f8",count=shape[0]*shape[1],offset=offset).reshape(shape)
+
+    return _decodeMeta(meta,readBlock)
+
+
+def _decodeMeta(meta,readBlock):
+    """Header and cars from a binary file's JSON header. readBlock(offset,shape) returns the
+       float64 block at that byte offset"""
+    header = {field:meta[field] for field in HEADER_FIELDS}
+    num_columns = len(meta["columns"])
+    num_states = len(STATE_COLUMNS)
+    cars = []
+    for car_meta in meta["cars"]:
+        shape = (num_columns,car_meta["num_steps"])
+        if car_meta["num_steps"] == 0:
+            block = np.empty(shape,dtype="<f8")
+        else:
+            block = readBlock(car_meta["offset"],shape)
+
+        car = {key:car_meta[key] for key in ("label","type","on_road","crash")}
+        car["states"] = block[:num_states].T
+        car["actions"] = block[num_states:].T
+        cars.append(car)
+
+    return header,cars
+
+
+def _close(results,fsync):
+    if fsync:
+        results.flush()
+        os.fsync(results.fileno())
+    results.close()
+
+
+def _tupleList(rows):
+    """Rows as the str() of a list of tuples, whether they are given as one or as an array"""
+    if isinstance(rows,np.ndarray):
+        rows = [tuple(x) for x in rows.tolist()]
+    return str(rows)
+
+
+def _align(num_bytes):
+    return int(np.ceil(num_bytes/BINARY_ALIGNMENT))*BINARY_ALIGNMENT
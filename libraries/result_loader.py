@@ -0,0 +1,116 @@
+import glob
+import numpy as np
+import os
+import re
+
+from result_io import ACTION_COLUMNS,HEADER_FIELDS,STATE_COLUMNS,loadBinaryResults
+
+#File name prefix used by each experiment's runExperiment
+EXPERIMENT_PREFIXES = {"lane_change_results":"exp1a","lane_keeping_results":"exp1b","exp2_results":"exp2"}
+
+#<prefix>-<start time>-<round index>.<extension>
+RESULT_NAME = re.compile(r"^(?P<prefix>.+)-(?P<start_time>\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2})-(?P<round>\d+)\.(?P<extension>txt|bin)$")
+
+#Every character that is not part of a number in a "[(a, b), (c, d)]" list becomes a separator
+_TUPLE_LIST_TABLE = str.maketrans({"[":" ","]":" ","(":" ",")":" "})
+
+
+def parseResultName(path):
+    """Returns a dictionary with the experiment, prefix, start_time, round and extension encoded
+       in a results file name, or None if the name does not follow the results naming scheme"""
+    match = RESULT_NAME.match(os.path.basename(path))
+    if match is None:
+        return None
+    name = match.groupdict()
+    name["round"] = int(name["round"])
+    name["experiment"] = EXPERIMENT_PREFIXES.get(name["prefix"])
+    return name
+
+
+def parseTupleList(text,width):
+    """Parses the str() of a list of equal length tuples of floats (as written for States and
+       Actions) into an (N,width) array, without evaluating the text as Python"""
+    text = text.strip()
+    if not (text.startswith("[") and text.endswith("]")):
+        raise ValueError("Expected a bracketed list, got '{}...'".format(text[:20]))
+    num_rows = text.count("(")
+    if num_rows == 0:
+        return np.empty((0,width))
+
+    tokens = text.translate(_TUPLE_LIST_TABLE).split(",")
+    if len(tokens) != num_rows*width:
+        raise ValueError("Expected {} values for {} tuples of width {}, found {}".format(num_rows*width,num_rows,width,len(tokens)))
+    return np.array(tokens,dtype=float).reshape(num_rows,width)
+
+
+def loadTextResults(path):
+    """Reads a text results file written by runExperiment. Returns the header dictionary and a list
+       of car dictionaries (label, type, on_road, crash, states, actions) as loadBinaryResults does,
+       with states an (N,4) and actions an (N,2) array. The file is read one line at a time"""
+    header = {}
+    cars = []
+    car = None
+    results = open(path,"r")
+    for line in results:
+        line = line.rstrip("\n")
+        if line == "":
+            continue
+        key,sep,value = line.partition(": ")
+        if not sep:
+            #A bare line starts the next car's section
+            car = {"label":line}
+            cars.append(car)
+        elif car is None:
+            header[key] = _parseNumber(value)
+        elif key == "Type":
+            car["type"] = value
+        elif key == "On Road":
+            car["on_road"] = int(value)
+        elif key == "Crash":
+            car["crash"] = int(value)
+        elif key == "States":
+            car["states"] = parseTupleList(value,len(STATE_COLUMNS))
+        elif key == "Actions":
+            car["actions"] = parseTupleList(value,len(ACTION_COLUMNS))
+    results.close()
+
+    missing = [field for field in HEADER_FIELDS if field not in header]
+    if missing:
+        raise ValueError("{} is missing header fields {}".format(path,missing))
+    return header,cars
+
+
+def loadResults(path,mmap=True):
+    """Loads a single results file of either format"""
+    if path.endswith(".bin"):
+        return loadBinaryResults(path,mmap=mmap)
+    return loadTextResults(path)
+
+
+def listResults(directory,experiment=None):
+    """Paths of the results files in directory (optionally only those of one experiment), ordered by
+       start time then round index"""
+    paths = []
+    for path in glob.glob(os.path.join(directory,"*")):
+        name = parseResultName(path)
+        if name is not None and (experiment is None or name["experiment"] == experiment):
+            paths.append((name["start_time"],name["round"],path))
+    return [path for _,_,path in sorted(paths)]
+
+
+def iterResults(directory,experiment=None,mmap=True):
+    """Lazily yields (path,header,cars) for every results file in directory, one file at a time,
+       so a whole directory can be streamed without holding more than one round in memory"""
+    for path in listResults(directory,experiment):
+        header,cars = loadResults(path,mmap=mmap)
+        yield path,header,cars
+
+
+def _parseNumber(value):
+    try:
+        return int(value)
+    except ValueError:
+        try:
+            return float(value)
+        except ValueError:
+            return value
@@ -0,0 +1,68 @@
+import queue
+import threading
+
+from result_index import indexRound
+from result_io import writeResults
+
+
+class ResultWriter():
+    """Formats, writes, syncs and indexes finished rounds on a background thread, so the next round
+       can start as soon as the last one ends. At most max_pending rounds wait to be written; beyond
+       that submit blocks, so a slow disk holds the experiment back rather than letting finished
+       rounds pile up in memory.
+       The round data is written as it is when the thread gets to it, so it must not be modified
+       after it is submitted (the harness submits copies of the logs)"""
+    def __init__(self,max_pending=2,fsync=True):
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.fsync = fsync
+        self.paths = [] #every path written so far, in the order the rounds were submitted
+        self.error = None
+
+        #Daemon so an interpreter exiting on an error is never held up; close() is what guarantees the writes
+        self.thread = threading.Thread(target=self._run,name="result_writer",daemon=True)
+        self.thread.start()
+
+
+    def submit(self,address,header,cars,result_format="text"):
+        """Queues a round for writeResults (and indexRound). Raises any error from an earlier write"""
+        self._raiseError()
+        self.queue.put((address,header,cars,result_format))
+
+
+    def _run(self):
+        while True:
+            job = self.queue.get()
+            try:
+                if job is None:
+                    return
+                if self.error is None:
+                    address,header,cars,result_format = job
+                    path = writeResults(address,header,cars,result_format,fsync=self.fsync)
+                    indexRound(path,cars)
+                    self.paths.append(path)
+            except BaseException as e:
+                #Includes writeResults' exit on a bad format. Kept to be re-raised on the main thread,
+                # and no later rounds are written
+                self.error = e
+            finally:
+                self.queue.task_done()
+
+
+    def _raiseError(self):
+        if self.error is not None:
+            error,self.error = self.error,None
+            raise error
+
+
+    def flush(self):
+        """Blocks until every round submitted so far has been written"""
+        self.queue.join()
+        self._raiseError()
+
+
+    def close(self):
+        """Writes everything still queued and stops the thread"""
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+        self._raiseError()
@@ -0,0 +1,8 @@
+import os
+import sys
+
+#The libraries are imported as top level modules, as the experiments and benchmarks import them.
+# Tests that need the simulator are skipped when the driving_simulator submodule is not checked out
+LIBRARIES = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0,os.path.join(LIBRARIES,"driving_simulator"))
+sys.path.insert(0,LIBRARIES)
@@ -0,0 +1,102 @@
+"""forwardSimulate against stepping one car at a time, and against the simulator's own Car.move"""
+import math
+import numpy as np
+import pytest
+
+from forward_simulation import checkRound,forwardSimulate,forwardSimulateRounds,stackActions
+
+HEADER = {"num_cars":1,"lane_width":5,"veh_length":4.6,"veh_width":2,"dt":0.1,"speed_limit":5.5}
+AXLE_LENGTH = 2.72
+
+
+def stepCar(state,actions,dt,axle_length):
+    """The model forwardSimulate documents, one step at a time"""
+    x,y,velocity,heading = state
+    states = [(x,y,velocity,heading)]
+    for accel,yaw_rate in actions:
+        x,y,velocity,heading = x+velocity*math.cos(heading)*dt,y-velocity*math.sin(heading)*dt,velocity+accel*dt,\
+                               heading+velocity*math.tan(yaw_rate)/axle_length*dt
+        states.append((x,y,velocity,heading))
+    return np.array(states)
+
+
+def randomActions(num_sequences,num_steps,seed=0):
+    rng = np.random.RandomState(seed)
+    return np.stack([rng.uniform(-3,3,(num_sequences,num_steps)),np.radians(rng.uniform(-10,10,(num_sequences,num_steps)))],axis=-1)
+
+
+def testMatchesSteppingOneCarAtATime():
+    actions = randomActions(6,80)
+    init_states = np.array([[0,2.5,5,0],[10,7.5,4,0.1],[0,0,0,0],[3,3,6,6.2],[0,2.5,5,math.pi],[1,1,1,1]],dtype=float)
+    dt = np.array([0.1,0.1,0.05,0.05,0.01,0.1])
+    states = forwardSimulate(init_states,actions,dt,AXLE_LENGTH)
+    assert states.shape == (6,81,4)
+    for i in range(6):
+        expected = stepCar(init_states[i],actions[i],dt[i],AXLE_LENGTH)
+        expected[:,3] %= 2*np.pi
+        assert states[i] == pytest.approx(expected,abs=1e-9)
+
+
+def testStackActionsPadsWithNoAction():
+    actions,lengths = stackActions([[(1,0.1)]*3,[(2,0.2)]*5])
+    assert actions.shape == (2,5,2) and lengths.tolist() == [3,5]
+    assert (actions[0,3:] == 0).all()
+
+
+def loggedRound(actions,dt=0.1):
+    """A round whose states were logged by a simulator moving its car as forwardSimulate does"""
+    states = stepCar((0.0,2.5,5.0,0.0),actions,dt,AXLE_LENGTH)[:-1]
+    states[:,3] %= 2*np.pi
+    car = {"label":"Ego","type":"passive","on_road":1,"crash":0,"states":states,"actions":np.asarray(actions)}
+    return dict(HEADER,dt=dt),[car]
+
+
+def testCheckRound():
+    actions = randomActions(1,60)[0]
+    header,cars = loggedRound(actions)
+    assert [x["match"] for x in checkRound(header,cars,AXLE_LENGTH,tolerance=1e-9)] == [True]
+    assert forwardSimulateRounds([(header,cars)],0,AXLE_LENGTH)[0].shape == (61,4)
+
+    #A simulator that moved the car differently from step 20 on is caught there
+    cars[0]["states"] = cars[0]["states"].copy()
+    cars[0]["states"][20:,0] += 0.01
+    report = checkRound(header,cars,AXLE_LENGTH,tolerance=1e-9)
+    assert not report[0]["match"] and report[0]["first_divergence"] == 20
+
+
+def testMatchesTheSimulatorsCarMove(tmp_path):
+    """Runs a single car headlessly through the simulator, so every state is logged by its own
+       vehicle_classes Car.move, and checks forwardSimulate reproduces them from the logged
+       actions. Skipped when the driving_simulator submodule is not checked out"""
+    pytest.importorskip("vehicle_classes")
+    pytest.importorskip("simulator")
+    from experiment_harness import CarSpec,Harness,RoadSpec,ScenarioSpec
+    from trigger_plan import DistanceTravelled
+
+    class Driver():
+        def __init__(self):
+            self.index = 0
+
+        def selectAction(self,state,*args):
+            self.index += 1
+            return (0.5 if self.index<30 else -0.5,3.0 if self.index<20 else -3.0)
+
+        def reset(self):
+            self.index = 0
+
+    def setup(harness):
+        harness.endWhen(DistanceTravelled(harness.ego,80))
+
+    spec = ScenarioSpec("forward_simulation",RoadSpec([5,100],runtime=20.0),[CarSpec("car",[(0,1),1],[(1,2),1],5,ego=True,label="Ego",type_index=0)],\
+                        setup=setup,round_types=[("passive",)])
+    harness = Harness(spec,headless=True,driver=Driver(),background_writes=False)
+    try:
+        harness.run([("passive",)])
+        states,actions = harness.logs["car"].records()
+    finally:
+        harness.wrapUp()
+
+    cars = [{"label":"Ego","type":"passive","on_road":1,"crash":0,"states":states,"actions":actions}]
+    report = checkRound(dict(HEADER,dt=spec.params["dt"]),cars,spec.params["axle_length"])
+    assert len(states)>10
+    assert report[0]["match"],report[0]
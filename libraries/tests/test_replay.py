@@ -0,0 +1,79 @@
+"""The parts of the replay tools that do not need the simulator"""
+import math
+import numpy as np
+import pytest
+
+from experiment_harness.replay import DEFAULT_TOLERANCE,ReplayDriver,compareStates,loadScenario
+from result_io import writeResults
+from result_loader import loadResults
+
+
+def states(num_steps,heading=0.0):
+    t = np.arange(num_steps)*0.1
+    return np.stack([5*t,np.full(num_steps,2.5),np.full(num_steps,5.0),np.full(num_steps,heading)],axis=-1)
+
+
+def testReplayDriverPlaysActionsInDegrees():
+    actions = [(0.5,math.radians(10.0)),(-1.0,math.radians(-3.0))]
+    driver = ReplayDriver(actions)
+    assert driver.selectAction({}) == (0.5,pytest.approx(10.0))
+    assert driver.selectAction({}) == (-1.0,pytest.approx(-3.0))
+    #Coasts once the log runs out
+    assert driver.selectAction({}) == (0,0)
+    driver.reset()
+    assert driver.selectAction({})[0] == 0.5
+
+
+def testReplayDriverLoadsWrittenActions(tmp_path):
+    """Actions as loaded from either results format, arrays or memory-mapped views"""
+    actions = [(0.25*i,math.radians(i)) for i in range(5)]
+    cars = [{"label":"Ego Car","type":"passive","on_road":1,"crash":0,"states":states(5).tolist(),"actions":actions}]
+    header = {"num_cars":1,"lane_width":5,"veh_length":4.6,"veh_width":2,"dt":0.1,"speed_limit":5.5}
+    for result_format in ("text","binary"):
+        path = writeResults(str(tmp_path/"exp2_results-2020-01-01_00-00-00-0"),header,cars,result_format)
+        _,loaded = loadResults(path)
+        driver = ReplayDriver()
+        driver.load(loaded[0]["actions"])
+        assert [driver.selectAction({}) for _ in range(5)] == [(0.25*i,pytest.approx(float(i))) for i in range(5)]
+
+
+def testIdenticalStatesMatch():
+    report = compareStates(states(20),states(20))
+    assert report["match"] and report["first_divergence"] is None
+    assert report["logged_steps"] == report["replayed_steps"] == 20
+    assert all(x == 0 for x in report["max_error"].values())
+
+
+def testFirstDivergence():
+    replayed = states(20)
+    replayed[7:,0] += 1e-3
+    replayed[12,1] += DEFAULT_TOLERANCE/2
+    report = compareStates(states(20),replayed)
+    assert not report["match"] and report["first_divergence"] == 7
+    assert report["max_error"]["x"] == pytest.approx(1e-3)
+    assert report["max_error"]["y"] == pytest.approx(DEFAULT_TOLERANCE/2)
+
+
+def testHeadingsAreComparedAsAngles():
+    report = compareStates(states(10,heading=2*math.pi-1e-8),states(10,heading=1e-8))
+    assert report["match"] and report["max_error"]["heading"] == pytest.approx(2e-8)
+
+
+def testDifferentLengthsDoNotMatch():
+    report = compareStates(states(20),states(15))
+    assert not report["match"] and report["first_divergence"] is None
+    assert (report["logged_steps"],report["replayed_steps"]) == (20,15)
+    assert not compareStates(states(0),states(3))["match"]
+
+
+def testTolerance():
+    replayed = states(5)
+    replayed[:,2] += 0.01
+    assert not compareStates(states(5),replayed)["match"]
+    assert compareStates(states(5),replayed,tolerance=0.02)["match"]
+
+
+def testLoadScenario(tmp_path):
+    path = tmp_path/"scenario.py"
+    path.write_text("SCENARIO = {'name':'test'}\n")
+    assert loadScenario(str(path)) == {"name":"test"}
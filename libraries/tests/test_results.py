@@ -0,0 +1,189 @@
+"""Round trips between the text and binary results formats, the archive and the index"""
+import math
+import numpy as np
+import os
+import pytest
+
+from result_archive import ArchiveWriter,ResultArchive,archiveResults
+from result_index import INDEX_NAME,ResultIndex,indexRound,summariseFile
+from result_io import decodeBinaryResults,encodeBinaryResults,loadBinaryResults,writeResults
+from result_loader import listResults,loadResults,loadTextResults,parseResultName,parseTupleList
+
+HEADER = {"num_cars":2,"lane_width":5,"veh_length":4.6,"veh_width":2,"dt":0.1,"speed_limit":5.5}
+
+
+def makeCars(num_steps=25,seed=0):
+    """Two cars with irregular floats, as written by Harness.writeRound"""
+    rng = np.random.RandomState(seed)
+    cars = []
+    for i,(label,car_type) in enumerate((("Ego Car","aggressive"),("Other Car","passive"))):
+        states = [(float(x),float(y),float(v),math.radians(float(h))) for x,y,v,h in rng.uniform(-100,100,(num_steps,4))]
+        actions = [(float(a),math.radians(float(w))) for a,w in rng.uniform(-10,10,(num_steps,2))]
+        cars.append({"label":label,"type":car_type,"on_road":1,"crash":i,"states":states,"actions":actions})
+    return cars
+
+
+def assertSameRound(header,cars,expected_header,expected_cars):
+    assert header == expected_header
+    assert len(cars) == len(expected_cars)
+    for car,expected in zip(cars,expected_cars):
+        for key in ("label","type","on_road","crash"):
+            assert car[key] == expected[key]
+        #Exact, not approximate: every format has to keep the floats bit for bit
+        assert np.array_equal(np.asarray(car["states"],dtype=float).reshape(-1,4),np.asarray(expected["states"],dtype=float).reshape(-1,4))
+        assert np.array_equal(np.asarray(car["actions"],dtype=float).reshape(-1,2),np.asarray(expected["actions"],dtype=float).reshape(-1,2))
+
+
+def address(directory,round_index,prefix="lane_keeping_results"):
+    """Where round round_index is written in directory (created if need be), without extension"""
+    os.makedirs(str(directory),exist_ok=True)
+    return os.path.join(str(directory),"{}-2020-01-01_00-00-00-{}".format(prefix,round_index))
+
+
+@pytest.mark.parametrize("result_format",["text","binary"])
+def testFormatRoundTrip(tmp_path,result_format):
+    cars = makeCars()
+    path = writeResults(address(tmp_path,0),HEADER,cars,result_format)
+    header,loaded = loadResults(path)
+    assertSameRound(header,loaded,HEADER,cars)
+
+
+def testArrayInputWritesTheSameText(tmp_path):
+    cars = makeCars()
+    array_cars = [dict(car,states=np.array(car["states"]),actions=np.array(car["actions"])) for car in cars]
+    tuples = writeResults(address(tmp_path,0),HEADER,cars,"text")
+    arrays = writeResults(address(tmp_path,1),HEADER,array_cars,"text")
+    assert open(tuples).read() == open(arrays).read()
+
+
+def testTextToBinaryToText(tmp_path):
+    cars = makeCars()
+    text_path = writeResults(address(tmp_path/"a",0),HEADER,cars,"text")
+    header,loaded = loadTextResults(text_path)
+    binary_path = writeResults(address(tmp_path,0),header,loaded,"binary")
+    header,loaded = loadBinaryResults(binary_path,mmap=False)
+    text_again = writeResults(address(tmp_path/"b",0),header,loaded,"text")
+    assert open(text_path).read() == open(text_again).read()
+
+
+@pytest.mark.parametrize("mmap",[True,False])
+def testBinaryEmptyCar(tmp_path,mmap):
+    cars = makeCars()
+    cars[1]["states"],cars[1]["actions"] = [],[]
+    path = writeResults(address(tmp_path,0),HEADER,cars,"binary")
+    header,loaded = loadBinaryResults(path,mmap=mmap)
+    assertSameRound(header,loaded,HEADER,cars)
+    assert loaded[1]["states"].shape == (0,4) and loaded[1]["actions"].shape == (0,2)
+
+
+def testDecodeMatchesEncode():
+    cars = makeCars()
+    header,loaded = decodeBinaryResults(encodeBinaryResults(HEADER,cars))
+    assertSameRound(header,loaded,HEADER,cars)
+
+
+def testBinaryRejectsOtherFiles(tmp_path):
+    path = writeResults(address(tmp_path,0),HEADER,makeCars(),"text")
+    with pytest.raises(ValueError):
+        loadBinaryResults(path)
+
+
+def testParseTupleList():
+    assert parseTupleList("[]",4).shape == (0,4)
+    assert np.array_equal(parseTupleList(str([(0,1.5),(-2e-05,3.0)]),2),np.array([[0,1.5],[-2e-05,3.0]]))
+    with pytest.raises(ValueError):
+        parseTupleList(str([(0,1.5,2)]),2)
+
+
+def testParseResultName():
+    name = parseResultName("/x/lane_keeping_results-2020-01-01_00-00-00-12.bin")
+    assert name["experiment"] == "exp1b" and name["round"] == 12 and name["extension"] == "bin"
+    assert parseResultName("/x/index.jsonl") is None
+
+
+def testListResultsOrder(tmp_path):
+    for i in (10,2,1):
+        writeResults(address(tmp_path,i),HEADER,makeCars(3),"text")
+    assert [parseResultName(x)["round"] for x in listResults(str(tmp_path))] == [1,2,10]
+
+
+@pytest.mark.parametrize("codec",["zlib","lzma"])
+def testArchiveRoundTrip(tmp_path,codec):
+    rounds = {}
+    for i in range(5):
+        rounds[i] = makeCars(10+i,seed=i)
+        writeResults(address(tmp_path/"results",i),HEADER,rounds[i],"text" if i%2 == 0 else "binary")
+
+    #A small chunk size, so rounds are spread over several chunks
+    archive_path = str(tmp_path/"results.arc")
+    assert archiveResults(str(tmp_path/"results"),archive_path,codec=codec,chunk_size=2000) == 5
+    archive = ResultArchive(archive_path)
+    assert len(archive.chunks)>1
+    for record,header,cars in archive.loadRounds():
+        assertSameRound(header,cars,HEADER,rounds[record["round"]])
+    assert [x["round"] for x in archive.query(round=lambda x: x>=3)] == [3,4]
+    assert [x["format"] for x in archive.query(experiment="exp1b")] == ["txt","bin","txt","bin","txt"]
+
+    #Extracting writes every round back out in its original format, byte for byte
+    archive.extract(str(tmp_path/"extracted"))
+    for path in listResults(str(tmp_path/"results")):
+        extracted = os.path.join(str(tmp_path/"extracted"),os.path.basename(path))
+        assert open(path,"rb").read() == open(extracted,"rb").read()
+
+
+def testArchiveReadsAnyRoundByName(tmp_path):
+    archive_path = str(tmp_path/"results.arc")
+    writer = ArchiveWriter(archive_path,chunk_size=1)
+    rounds = [makeCars(5,seed=i) for i in range(3)]
+    for i,cars in enumerate(rounds):
+        writer.add("sub/exp2_results-2020-01-01_00-00-00-{}.bin".format(i),HEADER,cars)
+    writer.close()
+
+    archive = ResultArchive(archive_path)
+    for i in (2,0,1):
+        header,cars = archive.load("sub/exp2_results-2020-01-01_00-00-00-{}.bin".format(i))
+        assertSameRound(header,cars,HEADER,rounds[i])
+
+
+def testArchiveRejectsOtherFiles(tmp_path):
+    path = writeResults(address(tmp_path,0),HEADER,makeCars(),"binary")
+    with pytest.raises(ValueError):
+        ResultArchive(path)
+
+
+def testIndexQueries(tmp_path):
+    for i in range(4):
+        cars = makeCars(5+i,seed=i)
+        cars[0]["type"] = "aggressive" if i<2 else "passive"
+        path = writeResults(address(tmp_path,i),HEADER,cars,"binary" if i%2 else "text")
+        indexRound(path,cars)
+
+    index = ResultIndex(str(tmp_path)).load()
+    assert [x["round"] for x in index.query(ego_type="passive")] == [2,3]
+    assert [x["round"] for x in index.query(ego_num_steps=lambda x: x>6)] == [2,3]
+    assert index.paths(format="bin") == [address(tmp_path,1)+".bin",address(tmp_path,3)+".bin"]
+    for record,header,cars in index.loadRounds(round=1):
+        assert header == HEADER and len(cars[0]["states"]) == 6
+
+
+def testIndexSummaryMatchesWrittenRecord(tmp_path):
+    """Indexing a file afterwards gives the same entry as indexing it as it is written"""
+    for i,result_format in enumerate(("text","binary")):
+        cars = makeCars(7)
+        path = writeResults(address(tmp_path,i),HEADER,cars,result_format)
+        indexRound(path,cars)
+    written = ResultIndex(str(tmp_path)).load().records
+
+    os.remove(os.path.join(str(tmp_path),INDEX_NAME))
+    rebuilt = ResultIndex(str(tmp_path)).rebuild().records
+    assert rebuilt == written
+    assert summariseFile(address(tmp_path,0)+".txt") == written[os.path.basename(address(tmp_path,0))+".txt"]
+
+
+def testIndexUpdateOnlyAddsNewFiles(tmp_path):
+    writeResults(address(tmp_path,0),HEADER,makeCars(3),"text")
+    index = ResultIndex(str(tmp_path)).update()
+    writeResults(address(tmp_path,1),HEADER,makeCars(3),"binary")
+    index.update()
+    lines = open(os.path.join(str(tmp_path),INDEX_NAME)).read().splitlines()
+    assert len(lines) == 2 and len(index.query()) == 2
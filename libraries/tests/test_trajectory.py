@@ -0,0 +1,166 @@
+"""The array paths of trajectory_type_definitions against the scalar ones"""
+import math
+import numpy as np
+import pytest
+
+from trajectory_type_definitions import LaneChangeController,LaneChangeTrajectory,Line,laneChangeBatch,laneChangeGrid
+
+INIT_STATE = {"position":(10.0,7.5),"velocity":5.0,"heading":3.0}
+DEST_STATE = {"position":(60.0,2.5),"velocity":5.5,"heading":0.0}
+AXLE_LENGTH = 2.72
+#The array paths use numpy's arctan, which may round differently to math.atan
+TOLERANCE = 1e-9
+
+
+def randomStates(num_states,seed=0):
+    rng = np.random.RandomState(seed)
+    init_states = {"position":np.stack([rng.uniform(0,50,num_states),rng.uniform(0,10,num_states)],axis=-1),\
+                   "velocity":rng.uniform(0.5,8,num_states),"heading":rng.uniform(-20,20,num_states)}
+    dest_states = {"position":np.stack([rng.uniform(50,100,num_states),rng.uniform(0,10,num_states)],axis=-1),\
+                   "velocity":rng.uniform(0.5,8,num_states),"heading":np.zeros(num_states)}
+    return init_states,dest_states,rng.uniform(1,20,num_states)
+
+
+def stateAt(states,i):
+    return {"position":tuple(states["position"][i].tolist()),"velocity":float(states["velocity"][i]),"heading":float(states["heading"][i])}
+
+
+def testLineArithmetic():
+    line = Line(1.0,-2.0,3.0)
+    other = Line(4.0,5.0)
+    for t in (-1.5,0.0,2.0):
+        assert line(t) == t*t-2*t+3
+        assert (line+other)(t) == pytest.approx(line(t)+other(t))
+        assert (line-2)(t) == pytest.approx(line(t)-2)
+        assert (line*other)(t) == pytest.approx(line(t)*other(t))
+        assert (3*line)(t) == pytest.approx(3*line(t))
+    assert np.array_equal(line.evaluateArray(np.array([-1.5,0.0,2.0])),[line(-1.5),line(0.0),line(2.0)])
+
+
+def testLineDerivativeFollowsUpdate():
+    line = Line(1.0,-2.0,3.0)
+    derivative = line.derivative()
+    assert derivative is line.derivative() and derivative(2.0) == 2.0
+    line.update(3.0,0.0,0.0)
+    assert line.derivative() is derivative and derivative(2.0) == 12.0
+
+
+def testLineDotKeepsCoefficientPairs():
+    line = Line(1.0,-2.0,3.0)
+    assert line.coefs == [(3.0,0),(-2.0,1),(1.0,2)]
+    assert line.dot() == [(0,0),(-2.0,0),(2.0,1)]
+    assert line.dot(line.dot()) == [(0,0),(0,0),(2.0,0)]
+
+
+@pytest.mark.parametrize("T,dt",[(5,.1),(15,.05),(4.3,.1)])
+def testArraysMatchScalars(T,dt):
+    trajectory = LaneChangeTrajectory(INIT_STATE,DEST_STATE,T)
+    t = np.append(trajectory.sampleTimes(dt),T+1)
+    x,y = trajectory.positionArray(t)
+    acceleration,yaw_rate = trajectory.actionArray(t,AXLE_LENGTH)
+    velocity = trajectory.velocityArray(t)
+    heading = trajectory.headingArray(t)
+    states = trajectory.stateArrays(t,AXLE_LENGTH)
+    for i,time in enumerate(t.tolist()):
+        state = trajectory.state(time,AXLE_LENGTH)
+        assert (x[i],y[i]) == state["position"]
+        assert velocity[i] == state["velocity"]
+        assert heading[i] == pytest.approx(state["heading"],abs=TOLERANCE)
+        assert acceleration[i] == pytest.approx(state["acceleration"],abs=TOLERANCE)
+        assert yaw_rate[i] == pytest.approx(state["yaw_rate"],abs=TOLERANCE)
+        assert states["heading"][i] == heading[i] and states["yaw_rate"][i] == yaw_rate[i]
+    #Past the end of the trajectory there is no action
+    assert acceleration[-1] == 0 and yaw_rate[-1] == 0
+
+
+def testSampleTimesCoverTheHorizon():
+    trajectory = LaneChangeTrajectory(INIT_STATE,DEST_STATE,5)
+    t = trajectory.sampleTimes(.1)
+    assert len(t) == 52 and t[-1] == pytest.approx(5.1)
+
+
+def testCompleteListsMatchScalars():
+    trajectory = LaneChangeTrajectory(INIT_STATE,DEST_STATE,5)
+    times = trajectory.sampleTimes(.1).tolist()
+    assert trajectory.completePositionList(.1) == [trajectory.position(t) for t in times]
+    assert trajectory.completeVelocityList(.1) == [trajectory.velocity(t) for t in times]
+    assert trajectory.completeHeadingList(.1) == pytest.approx([trajectory.heading(t) for t in times],abs=TOLERANCE)
+    actions = np.array(trajectory.completeActionList(AXLE_LENGTH,.1))
+    assert actions == pytest.approx(np.array([trajectory.action(t,AXLE_LENGTH) for t in times]),abs=TOLERANCE)
+
+
+def testSamplesAreMemoisedAndShared():
+    trajectory = LaneChangeTrajectory(INIT_STATE,DEST_STATE,5)
+    samples = trajectory.sample(.1)
+    with_actions = trajectory.sample(.1,AXLE_LENGTH)
+    assert trajectory.sample(.1) is samples and trajectory.sample(.1,AXLE_LENGTH) is with_actions
+    assert with_actions.x is samples.x and samples.acceleration is None
+    assert trajectory.sample(.05) is not samples
+    assert samples.positions().shape == (len(samples),2)
+
+
+def testReplanMatchesANewTrajectory():
+    trajectory = LaneChangeTrajectory(INIT_STATE,DEST_STATE,5)
+    trajectory.completeActionList(AXLE_LENGTH,.1)
+    init_state = {"position":(12.0,7.0),"velocity":5.2,"heading":4.0}
+    trajectory.replan(init_state,DEST_STATE,4.5)
+    fresh = LaneChangeTrajectory(init_state,DEST_STATE,4.5)
+    for t in (0.0,1.3,4.5):
+        assert trajectory.state(t,AXLE_LENGTH) == fresh.state(t,AXLE_LENGTH)
+    assert trajectory.completeActionList(AXLE_LENGTH,.1) == fresh.completeActionList(AXLE_LENGTH,.1)
+
+
+def testZeroVelocityHasNoAction():
+    still = {"position":(0.0,0.0),"velocity":0.0,"heading":0.0}
+    trajectory = LaneChangeTrajectory(still,still,5)
+    with pytest.raises(ZeroDivisionError):
+        trajectory.action(0.0,AXLE_LENGTH)
+    assert trajectory.heading(0.0) == 270
+    acceleration,_ = trajectory.actionArray(np.array([0.0]),AXLE_LENGTH)
+    assert np.isnan(acceleration[0])
+
+
+def testBatchMatchesSingleTrajectories():
+    init_states,dest_states,T = randomStates(20)
+    batch = laneChangeBatch(init_states,dest_states,T)
+    assert len(batch) == 20
+    t = np.linspace(0,20,41)
+    x,y = batch.position(t)
+    heading = batch.heading(t)
+    acceleration,yaw_rate = batch.action(t,AXLE_LENGTH)
+    scalar_acceleration,_ = batch.action(1.0,AXLE_LENGTH)
+    for i in range(len(batch)):
+        trajectory = LaneChangeTrajectory(stateAt(init_states,i),stateAt(dest_states,i),T[i])
+        single_x,single_y = trajectory.positionArray(t)
+        single_acceleration,single_yaw_rate = trajectory.actionArray(t,AXLE_LENGTH)
+        assert x[i] == pytest.approx(single_x,abs=TOLERANCE) and y[i] == pytest.approx(single_y,abs=TOLERANCE)
+        assert heading[i] == pytest.approx(trajectory.headingArray(t),abs=TOLERANCE)
+        assert acceleration[i] == pytest.approx(single_acceleration,abs=TOLERANCE)
+        assert yaw_rate[i] == pytest.approx(single_yaw_rate,abs=TOLERANCE)
+        assert scalar_acceleration[i] == pytest.approx(trajectory.action(1.0,AXLE_LENGTH)[0],abs=TOLERANCE)
+
+        extracted = batch.trajectory(i)
+        assert extracted.state(1.0,AXLE_LENGTH) == pytest.approx(trajectory.state(1.0,AXLE_LENGTH),abs=TOLERANCE)
+
+
+def testGridCoversEveryCombination():
+    batch,grid = laneChangeGrid(INIT_STATE,DEST_STATE,[3,5],dest_velocities=[4,5,6],lateral_offsets=[-1,0,1])
+    assert len(batch) == 18
+    assert sorted(zip(grid["T"].tolist(),grid["dest_velocity"].tolist(),grid["lateral_offset"].tolist())) == \
+                [(T,v,offset) for T in (3,5) for v in (4,5,6) for offset in (-1,0,1)]
+    x,y = batch.position(batch.traj_len_t)
+    assert np.diag(y) == pytest.approx(DEST_STATE["position"][1]+grid["lateral_offset"])
+
+
+def testControllerReplansInPlace():
+    controller = LaneChangeController(timestep=.1,dest_state=DEST_STATE,axle_length=AXLE_LENGTH,T=2)
+    state = dict(INIT_STATE)
+    first = controller.selectAction(state)
+    trajectory = controller.trajectory
+    assert first == trajectory.action(0,AXLE_LENGTH)
+    for _ in range(30):
+        accel,yaw_rate = controller.selectAction(state)
+        state = {"position":state["position"],"velocity":state["velocity"]+accel*.1,"heading":(state["heading"]+yaw_rate*.1)%360}
+    assert controller.trajectory is trajectory and (accel,yaw_rate) == (0,0)
+    controller.reset()
+    assert controller.selectAction(dict(INIT_STATE)) == pytest.approx(first)
@@ -0,0 +1,166 @@
+"""TriggerPlan, with stand-in cars and lanes in place of the simulator's"""
+import pytest
+
+from trigger_plan import Ahead,And,DistanceTravelled,Heading,Idle,OnLane,Radius,RelativeX,RelativeY,TriggerPlan
+
+
+class Lane():
+    pass
+
+
+class Road():
+    pass
+
+
+class Car():
+    def __init__(self,x=0.0,y=0.0,heading=0.0,on=None):
+        self.state = {"position":(x,y),"heading":heading}
+        self.on = on or []
+        self.accel = 0
+        self.yaw_rate = 0
+
+
+    def move(self,x,y,heading=None):
+        self.state = {"position":(x,y),"heading":self.state["heading"] if heading is None else heading}
+
+
+def makePlan(per_tick=False):
+    plan = TriggerPlan(per_tick=per_tick)
+    #Lane checks look for instances of the simulator's Lane class; this stands in for it
+    plan.lane_class = Lane
+    return plan
+
+
+class Counted():
+    """Wraps a car's "on" list and counts how often the lane check reads it"""
+    def __init__(self,on):
+        self.on = on
+        self.reads = 0
+
+
+    def __iter__(self):
+        self.reads += 1
+        return iter(self.on)
+
+
+    def __contains__(self,x):
+        return x in self.on
+
+
+@pytest.mark.parametrize("rel,expected",[('>',[False,False,True]),('<',[True,False,False]),('=',[False,True,False]),('?',[False,False,True])])
+def testRelativeX(rel,expected):
+    ego,other = Car(),Car()
+    trigger = makePlan().compile(RelativeX(ego,other,4.6,rel))
+    values = []
+    for x in (0.0,4.6,10.0):
+        ego.move(x,0)
+        values.append(trigger())
+    assert values == expected
+
+
+def testComparisons():
+    ego,other = Car(10,2,heading=359),Car(7,6)
+    plan = makePlan()
+    assert plan.compile(RelativeY(ego,other,3.9,'>'))()
+    assert not plan.compile(RelativeY(ego,other,3.9,'<'))()
+    assert plan.compile(Radius(ego,other,5.01))() and not plan.compile(Radius(ego,other,5.0))()
+    assert not plan.compile(Ahead(ego,other))() and plan.compile(Ahead(other,ego))()
+    assert plan.compile(DistanceTravelled(ego,9.5))() and not plan.compile(DistanceTravelled(other,9.5))()
+    #Within 2 degrees of 0 either side
+    assert plan.compile(Heading(ego,2))() and not plan.compile(Heading(ego,0.5))()
+
+
+def testIdle():
+    car = Car()
+    trigger = makePlan().compile(Idle(car))
+    assert trigger()
+    car.yaw_rate = 1
+    assert not trigger()
+
+
+def testOnLane():
+    lanes = [Lane(),Lane()]
+    road = Road()
+    ego,other = Car(on=[road,lanes[0]]),Car(on=[road,lanes[1]])
+    trigger = makePlan().compile(OnLane(ego,other))
+    assert not trigger()
+    other.on = [road,lanes[1],lanes[0]]
+    assert trigger()
+    #Sharing the road is not sharing a lane
+    other.on = [road]
+    assert not trigger()
+
+
+def testAnd():
+    ego,other = Car(10,0),Car(0,0)
+    plan = makePlan()
+    trigger = plan.compile(And([DistanceTravelled(ego,5),RelativeX(ego,other,4.6,'>')]))
+    assert trigger()
+    other.move(8,0)
+    assert not trigger()
+    assert plan.compile(And([]))()
+
+
+def testIdenticalExpressionsShareANode():
+    ego,other = Car(),Car()
+    plan = makePlan(per_tick=True)
+    first = plan.compile(And([OnLane(ego,other),RelativeX(ego,other,4.6,'<')]))
+    second = plan.compile(And([OnLane(ego,other),RelativeX(ego,other,4.6,'<')]))
+    on_lane = plan.compile(OnLane(ego,other))
+    assert first.index == second.index
+    #Still distinct callables, so both can be keys of one trigger dictionary
+    assert first is not second and len({first:1,second:2}) == 2
+    assert len(plan.nodes) == 3 and plan.nodes[on_lane.index][0].cars == (ego,other)
+    #Children come before their parents
+    assert on_lane.index<first.index
+
+
+def testPerTickKeepsLaneChecksUntilInvalidated():
+    lane = Lane()
+    ego,other = Car(on=Counted([lane])),Car(on=[lane])
+    plan = makePlan(per_tick=True)
+    on_lane = plan.compile(OnLane(ego,other))
+    conjunction = plan.compile(And([OnLane(ego,other),DistanceTravelled(ego,5)]))
+
+    assert on_lane() and not conjunction()
+    #Both triggers share the lane check, which is only evaluated once
+    assert ego.on.reads == 1
+    other.on = []
+    ego.move(10,0)
+    assert on_lane() and not conjunction()
+    assert ego.on.reads == 1
+
+    plan.invalidate()
+    assert not on_lane() and not conjunction()
+    assert ego.on.reads == 2
+    other.on = [lane]
+    plan.invalidate()
+    assert conjunction() and ego.on.reads == 3
+
+
+def testComparisonsAreNeverKept():
+    ego,other = Car(10,0),Car(0,0)
+    plan = makePlan(per_tick=True)
+    trigger = plan.compile(RelativeX(ego,other,4.6,'>'))
+    assert trigger()
+    ego.move(0,0)
+    assert not trigger()
+
+
+def testWithoutPerTickEveryCallIsFresh():
+    lane = Lane()
+    ego,other = Car(on=Counted([lane])),Car(on=[lane])
+    plan = makePlan()
+    on_lane = plan.compile(OnLane(ego,other))
+    assert on_lane() and on_lane()
+    assert ego.on.reads == 2
+    other.on = []
+    assert not on_lane()
+
+
+def testExpressionsOnlyImportTheSimulatorWhenCompiled():
+    #Building expressions (as scenario specs do) must not need road_classes
+    ego,other = Car(),Car()
+    expression = And([OnLane(ego,other),Idle(ego)])
+    assert expression.key() == And([OnLane(ego,other),Idle(ego)]).key()
+    assert expression.key() != And([OnLane(other,ego),Idle(ego)]).key()
@@ -0,0 +1,95 @@
+import math
+import numpy as np
+
+from result_io import ACTION_COLUMNS,STATE_COLUMNS
+
+#Columns of the log. Headings and yaw rates are converted to radians as they are logged, as the
+# results hold them; the controllers produce them in degrees
+LOG_COLUMNS = STATE_COLUMNS+ACTION_COLUMNS
+
+
+class TrajectoryLog():
+    """Drop-in replacement for a controller's log list. Each appended (state,(accel,yaw_rate)) entry
+       is written straight into a preallocated (capacity,len(LOG_COLUMNS)) float array, one row per
+       step, rather than kept as a dictionary and tuple.
+       By default the array doubles in size whenever it fills. With ring=True the capacity is fixed
+       and the oldest entries are overwritten, which bounds memory for live monitoring.
+       Arrays handed out by records() are never written to again: the log moves to a new array
+       when it is next cleared (or, in ring mode, appended to)"""
+    def __init__(self,capacity=1024,ring=False):
+        self.data = np.empty((max(1,int(capacity)),len(LOG_COLUMNS)))
+        self.ring = ring
+        self.size = 0 #number of entries held
+        self.count = 0 #number of entries ever appended since the last clear
+        self.shared = False #whether records() has handed out views of data
+
+
+    def append(self,entry):
+        state,action = entry
+        capacity = self.data.shape[0]
+        if self.ring:
+            if self.shared:
+                self.data = self.data.copy()
+                self.shared = False
+            row = self.count%capacity
+            self.size = min(self.size+1,capacity)
+        else:
+            if self.size == capacity:
+                self._grow()
+            row = self.size
+            self.size += 1
+        self.count += 1
+        self.data[row] = (state["position"][0],state["position"][1],state["velocity"],math.radians(state["heading"]),action[0],math.radians(action[1]))
+
+
+    def _grow(self):
+        data = np.empty((2*self.data.shape[0],self.data.shape[1]))
+        data[:self.size] = self.data[:self.size]
+        self.data = data
+        self.shared = False
+
+
+    def clear(self):
+        """Empties the log, keeping the allocated array unless records() has handed it out"""
+        if self.shared:
+            self.data = np.empty_like(self.data)
+            self.shared = False
+        self.size = 0
+        self.count = 0
+
+
+    def view(self):
+        """(size,len(LOG_COLUMNS)) array of the entries held, oldest first. Outside ring mode (or before
+           the ring wraps) this is a view onto the log, valid until the next append or clear"""
+        if self.ring and self.count>self.data.shape[0]:
+            start = self.count%self.data.shape[0]
+            return np.concatenate((self.data[start:],self.data[:start]))
+        return self.data[:self.size]
+
+
+    def records(self):
+        """The (x,y,v,heading) states and (accel,yaw_rate) actions written to the results, as (N,4)
+           and (N,2) views of the log's array (angles in radians). These are not copies, but stay
+           valid after the log is cleared and reused, so can be handed to a background writer"""
+        data = self.view()
+        self.shared = True
+        num_states = len(STATE_COLUMNS)
+        return data[:,:num_states],data[:,num_states:]
+
+    ###############################################################################################################
+    #List compatibility, for code that reads the log as a controller's log list
+
+    def __len__(self):
+        return self.size
+
+
+    def __getitem__(self,index):
+        """The entry as (state,action), where state only holds position, velocity and heading.
+           Angles are converted back to degrees, so may differ from those logged by rounding"""
+        x,y,velocity,heading,accel,yaw_rate = self.view()[index].tolist()
+        return ({"position":(x,y),"velocity":velocity,"heading":math.degrees(heading)},(accel,math.degrees(yaw_rate)))
+
+
+    def __iter__(self):
+        for x,y,velocity,heading,accel,yaw_rate in self.view().tolist():
+            yield ({"position":(x,y),"velocity":velocity,"heading":math.degrees(heading)},(accel,math.degrees(yaw_rate)))
@@ -1,15 +1,113 @@
+import array
 import math
 import numbers
+import numpy as np
 
 class Line():
+    """Fixed degree polynomial. Coefficients are stored highest power first in a compact
+       float array and the derivative is built once, then kept in step by update"""
+    __slots__ = ("c","_dot")
+
     def __init__(self,*args):
-        args = list(args)
-        args.reverse()
-        self.coefs = [(x,i) for i,x in enumerate(args)]
+        self.c = array.array('d',args)
+        self._dot = None
+
+
+    def __call__(self,t):
+        #Horner's scheme
+        res = 0.0
+        for coef in self.c:
+            res = res*t + coef
+        return res
+
+
+    def __len__(self):
+        return len(self.c)
+
+
+    def __repr__(self):
+        return "Line({})".format(",".join([str(x) for x in self.c]))
+
+
+    def __neg__(self):
+        return Line(*[-x for x in self.c])
+
+
+    def __add__(self,other):
+        if isinstance(other,Line):
+            num_coefs = max(len(self.c),len(other.c))
+            coefs = [0.0 for _ in range(num_coefs-len(self.c))] + list(self.c)
+            other_coefs = [0.0 for _ in range(num_coefs-len(other.c))] + list(other.c)
+            return Line(*[x+y for x,y in zip(coefs,other_coefs)])
+        elif isinstance(other,numbers.Number):
+            coefs = list(self.c)
+            coefs[-1] += other
+            return Line(*coefs)
+        return NotImplemented
+
+    __radd__ = __add__
+
+
+    def __sub__(self,other):
+        return self + (-other)
+
+
+    def __rsub__(self,other):
+        return (-self) + other
+
+
+    def __mul__(self,other):
+        if isinstance(other,Line):
+            coefs = [0.0 for _ in range(len(self.c)+len(other.c)-1)]
+            for i,x in enumerate(self.c):
+                for j,y in enumerate(other.c):
+                    coefs[i+j] += x*y
+            return Line(*coefs)
+        elif isinstance(other,numbers.Number):
+            return Line(*[x*other for x in self.c])
+        return NotImplemented
+
+    __rmul__ = __mul__
+
+
+    @property
+    def coefs(self):
+        """Coefficients as (coefficient,power) pairs, lowest power first"""
+        degree = len(self.c)-1
+        return [(x,degree-i) for i,x in enumerate(self.c)][::-1]
+
+
+    def evaluateArray(self,t):
+        return evaluateArray(t,self.c)
+
+
+    def update(self,*args):
+        """Replaces the coefficients in place (same argument order as the constructor)"""
+        self.c[:] = array.array('d',args)
+        if self._dot is not None:
+            self._dot.update(*self.derivativeCoefs())
+
+
+    def derivativeCoefs(self):
+        degree = len(self.c)-1
+        if degree == 0:
+            return [0.0]
+        return [x*(degree-i) for i,x in enumerate(self.c[:-1])]
+
+
+    def derivative(self,line=None):
+        """Derivative of the polynomial as a Line. Built on first use and cached, and kept in step
+           by update. line, if given, is used as the derivative instead of building it"""
+        if line is not None:
+            self._dot = line
+        elif self._dot is None:
+            self._dot = Line(*self.derivativeCoefs())
+        return self._dot
 
 
     def dot(self,coefs=None):
-        if coefs is None: coefs = list(self.coefs)
+        """Derivative of coefs (this line's (coefficient,power) pairs if None), in the same form"""
+        if coefs is None: coefs = self.coefs
         else: coefs = list(coefs)
 
         for i in range(len(coefs)):
@@ -21,7 +119,10 @@ class Line():
 
 
 class LaneChangeController():
-    def __init__(self,ego=None,timestep=.1,accel_range=None,dest_state=None,axle_length=4.6,T=None,**kwargs):
+    def __init__(self,ego=None,timestep=.1,accel_range=None,dest_state=None,axle_length=4.6,T=None,replan_every=1,replan_tolerance=None,**kwargs):
+        """replan_every: number of steps between refits of the trajectory to the current state
+           replan_tolerance: optional dictionary of maximum deviations from the plan (keys "position",
+           "velocity","heading") that force a refit before replan_every steps have passed"""
         self.ego = ego
         self.accel_range = accel_range
         self.dt = timestep
@@ -29,62 +130,126 @@ class LaneChangeController():
 
         self.trajectory = None
         self.index = 0
+        self.plan_index = 0 #index at which the trajectory was last fit
         self.axle_length = axle_length
         self.T = T
 
+        self.replan_every = replan_every
+        self.replan_tolerance = replan_tolerance
+
 
     def setup(self,ego=None,**kwargs):
         if ego is not None:
             self.ego = ego
 
 
+    def reset(self):
+        """Restarts the manoeuvre in place. The trajectory object is kept and refit to the state
+           passed to the next selectAction"""
+        self.index = 0
+        self.plan_index = 0
+
+
     def selectAction(self,state,*args):
         if self.index*self.dt<self.T:
-            self.trajectory = LaneChangeTrajectory(state,self.dest_state,self.T-self.index*self.dt)
-            accel,yaw_rate = self.trajectory.action(0,self.axle_length)
+            if self.needsReplan(state):
+                if self.trajectory is None:
+                    self.trajectory = LaneChangeTrajectory(state,self.dest_state,self.T-self.index*self.dt)
+                else:
+                    self.trajectory.replan(state,self.dest_state,self.T-self.index*self.dt)
+                self.plan_index = self.index
+            accel,yaw_rate = self.trajectory.action((self.index-self.plan_index)*self.dt,self.axle_length)
             #accel,yaw_rate = self.trajectory.action(self.index*self.dt,self.axle_length)
             self.index += 1
         elif self.index*self.dt==self.T:
-            accel,yaw_rate = self.trajectory.action(self.dt,self.axle_length)
+            accel,yaw_rate = self.trajectory.action((self.index-self.plan_index)*self.dt,self.axle_length)
             self.index += 1
         else:
             accel,yaw_rate = 0,0
         return accel,yaw_rate
 
 
+    def needsReplan(self,state):
+        """Returns True if the trajectory should be refit to the current state"""
+        if self.trajectory is None or self.index == 0 or self.index-self.plan_index>=self.replan_every:
+            return True
+        elif self.replan_tolerance is not None:
+            t = (self.index-self.plan_index)*self.dt
+            tolerance = self.replan_tolerance
+            if "position" in tolerance:
+                plan_x,plan_y = self.trajectory.position(t)
+                if math.sqrt((state["position"][0]-plan_x)**2 + (state["position"][1]-plan_y)**2)>tolerance["position"]:
+                    return True
+            if "velocity" in tolerance:
+                if abs(state["velocity"]-self.trajectory.velocity(t))>tolerance["velocity"]:
+                    return True
+            if "heading" in tolerance:
+                heading_diff = abs(state["heading"]-self.trajectory.heading(t))%360
+                if min(heading_diff,360-heading_diff)>tolerance["heading"]:
+                    return True
+        return False
+
+
 class LaneChangeTrajectory():
+    __slots__ = ("traj_len_t","line_x","line_y","x_dot","y_dot","x_dot_dot","y_dot_dot","samples")
+
     def __init__(self,init_state,dest_state,T):
         if init_state is None or dest_state is None:
             print("Error, default values for states are invalid")
             exit(-1)
         self.traj_len_t = T
-        self.line_x,self.line_y = laneChange(init_state,dest_state,T)
-        self.computeDerivatives()
+        (A_x,B_x,C_x),(A_y,B_y,C_y,D_y) = laneChangeCoefs(init_state,dest_state,T)
+
+        #Derivatives in closed form (as in LaneChangeTrajectoryBatch), handed to the lines as their
+        # cached derivatives so update keeps them in step on replan
+        self.x_dot_dot = Line(A_x*2*1)
+        self.y_dot_dot = Line(A_y*3*2,B_y*2*1)
+        self.x_dot = Line(A_x*2,B_x*1)
+        self.y_dot = Line(A_y*3,B_y*2,C_y*1)
+        self.x_dot.derivative(self.x_dot_dot)
+        self.y_dot.derivative(self.y_dot_dot)
+        self.line_x = Line(A_x,B_x,C_x)
+        self.line_y = Line(A_y,B_y,C_y,D_y)
+        self.line_x.derivative(self.x_dot)
+        self.line_y.derivative(self.y_dot)
+
+        self.samples = None #memoised sample() results keyed by (dt,axle_length)
 
 
     def computeDerivatives(self):
-        self.x = self.line_x.coefs
-        self.y = self.line_y.coefs
-        self.x_dot = self.line_x.dot()
-        self.y_dot = self.line_y.dot()
-        self.x_dot_dot = self.line_x.dot(self.x_dot)
-        self.y_dot_dot = self.line_y.dot(self.y_dot)
+        #Derivatives are cached on the lines, so these are shared rather than copied
+        self.x_dot = self.line_x.derivative()
+        self.y_dot = self.line_y.derivative()
+        self.x_dot_dot = self.x_dot.derivative()
+        self.y_dot_dot = self.y_dot.derivative()
+
+        self.samples = None #memoised sample() results keyed by (dt,axle_length)
+
+
+    def replan(self,init_state,dest_state,T):
+        """Refits the trajectory in place to go from init_state to dest_state in T seconds"""
+        coefs_x,coefs_y = laneChangeCoefs(init_state,dest_state,T)
+        self.traj_len_t = T
+
+        #Updating the lines also updates their cached derivatives
+        self.line_x.update(*coefs_x)
+        self.line_y.update(*coefs_y)
+        self.samples = None
 
 
     def action(self,t,axle_length):
         if t>self.traj_len_t:
             return 0,0
         else:
-            x = evaluate(t,self.x)
-            y = evaluate(t,self.y)
+            x_dot = self.x_dot(t)
+            y_dot = self.y_dot(t)
+            x_dot_dot = self.x_dot_dot(t)
+            y_dot_dot = self.y_dot_dot(t)
 
-            x_dot = evaluate(t,self.x_dot)
-            y_dot = evaluate(t,self.y_dot)
-            x_dot_dot = evaluate(t,self.x_dot_dot)
-            y_dot_dot = evaluate(t,self.y_dot_dot)
-
-            denom_a = math.sqrt(x_dot**2 + y_dot**2)
-            denom_yaw = denom_a**3
+            denom_a = math.sqrt(x_dot*x_dot + y_dot*y_dot)
+            if denom_a == 0:
+                raise ZeroDivisionError("Lane change trajectory has zero velocity at t={}, so its action is undefined".format(t))
+            denom_yaw = denom_a*denom_a*denom_a
 
             acceleration = ((x_dot*x_dot_dot)+(y_dot*y_dot_dot))/denom_a
             yaw_rate = math.degrees(math.atan(((x_dot*-y_dot_dot)-(-y_dot*x_dot_dot))*axle_length/denom_yaw))
@@ -93,17 +258,19 @@ class LaneChangeTrajectory():
 
 
     def position(self,t):
-        return (evaluate(t,self.x),evaluate(t,self.y))
+        return (self.line_x(t),self.line_y(t))
 
 
     def velocity(self,t):
-        return math.sqrt(evaluate(t,self.x_dot)**2 + evaluate(t,self.y_dot)**2)
+        x_dot = self.x_dot(t)
+        y_dot = self.y_dot(t)
+        return math.sqrt(x_dot*x_dot + y_dot*y_dot)
 
 
     def heading(self,t):
-        x_dot = evaluate(t,self.x_dot)
+        x_dot = self.x_dot(t)
         #minus here to capture the axis flip
-        y_dot = -evaluate(t,self.y_dot)
+        y_dot = -self.y_dot(t)
 
         if x_dot == 0:
             if y_dot>0: heading = 90
@@ -117,6 +284,46 @@ class LaneChangeTrajectory():
         return heading
 
 
+    def actionArray(self,t,axle_length):
+        """Vectorised equivalent of action. t is an array of timepoints, returns
+           arrays of accelerations and yaw rates (0 beyond the end of the trajectory)"""
+        t = np.asarray(t,dtype=float)
+        x_dot = self.x_dot.evaluateArray(t)
+        y_dot = self.y_dot.evaluateArray(t)
+        x_dot_dot = self.x_dot_dot.evaluateArray(t)
+        y_dot_dot = self.y_dot_dot.evaluateArray(t)
+
+        with np.errstate(divide='ignore',invalid='ignore'):
+            acceleration,yaw_rate = actionFromDerivatives(x_dot,y_dot,x_dot_dot,y_dot_dot,axle_length)
+
+        past_end = t>self.traj_len_t
+        acceleration = np.where(past_end,0.0,acceleration)
+        yaw_rate = np.where(past_end,0.0,yaw_rate)
+        return acceleration,yaw_rate
+
+
+    def positionArray(self,t):
+        """Vectorised equivalent of position. Returns arrays of x and y coordinates"""
+        t = np.asarray(t,dtype=float)
+        return self.line_x.evaluateArray(t),self.line_y.evaluateArray(t)
+
+
+    def velocityArray(self,t):
+        """Vectorised equivalent of velocity"""
+        t = np.asarray(t,dtype=float)
+        x_dot = self.x_dot.evaluateArray(t)
+        y_dot = self.y_dot.evaluateArray(t)
+        return np.sqrt(x_dot*x_dot + y_dot*y_dot)
+
+
+    def headingArray(self,t):
+        """Vectorised equivalent of heading"""
+        t = np.asarray(t,dtype=float)
+        x_dot = self.x_dot.evaluateArray(t)
+        y_dot = self.y_dot.evaluateArray(t)
+        return headingFromDerivatives(x_dot,y_dot)
+
+
     def state(self,t,axle_length=None):
         """Returns the estimated state at a known timepoint along the trajectory.
            ACtion omitted as this would require vehicle axle length"""
@@ -133,46 +340,109 @@ class LaneChangeTrajectory():
         return state
 
 
+    def stateArrays(self,t,axle_length=None):
+        """Vectorised equivalent of state. Each entry of the returned dictionary is an
+           array with one value per timepoint in t"""
+        x,y = self.positionArray(t)
+        state = {"position":(x,y),"velocity":self.velocityArray(t),"heading":self.headingArray(t)}
+
+        if axle_length is not None:
+            state["acceleration"],state["yaw_rate"] = self.actionArray(t,axle_length)
+        else:
+            state["acceleration"],state["yaw_rate"] = None,None
+
+        return state
+
+
+    def sampleTimes(self,dt=.1):
+        """Timepoints visited by the complete*List methods; i*dt for every i with i*dt<=T+dt"""
+        #Small allowance so a horizon that is a multiple of dt is not lost to rounding
+        num_samples = int(math.floor((self.traj_len_t+dt)/dt + 1e-9)) + 1
+        return np.arange(num_samples)*dt
+
+
+    def sample(self,dt=.1,axle_length=None):
+        """Evaluates every channel of the trajectory on the sampleTimes grid in a single pass.
+           Results are memoised per (dt,axle_length); the position, velocity and heading
+           arrays are shared between samplings at the same dt"""
+        if self.samples is None:
+            self.samples = {}
+        key = (dt,axle_length)
+        if key in self.samples:
+            return self.samples[key]
+
+        base = self.samples.get((dt,None))
+        if base is None:
+            t = self.sampleTimes(dt)
+            x_dot = self.x_dot.evaluateArray(t)
+            y_dot = self.y_dot.evaluateArray(t)
+            velocity = np.sqrt(x_dot*x_dot + y_dot*y_dot)
+            heading = headingFromDerivatives(x_dot,y_dot)
+
+            base = TrajectorySamples(t,self.line_x.evaluateArray(t),self.line_y.evaluateArray(t),velocity,heading)
+            self.samples[(dt,None)] = base
+
+        if axle_length is None:
+            return base
+
+        acceleration,yaw_rate = self.actionArray(base.t,axle_length)
+        samples = TrajectorySamples(base.t,base.x,base.y,base.velocity,base.heading,acceleration,yaw_rate)
+        self.samples[key] = samples
+        return samples
+
+
     def completePositionList(self,dt=.1):
-        t = 0
-        position_list = []
-        while t<=self.traj_len_t+dt:
-            position_list.append(self.position(t))
-            t += dt
+        samples = self.sample(dt)
+        return list(zip(samples.x.tolist(),samples.y.tolist()))
 
-        return position_list
 
     def completeHeadingList(self,dt=.1):
-        t = 0
-        heading_list = []
-        while t<= self.traj_len_t+dt:
-            heading_list.append(self.heading(t))
-            t += dt
-
-        return heading_list
+        return self.sample(dt).heading.tolist()
 
 
     def completeVelocityList(self,dt=.1):
-        t = 0
-        velocity_list = []
-        while t<=self.traj_len_t+dt:
-            velocity_list.append(self.velocity(t))
-            t += dt
-
-        return velocity_list
+        return self.sample(dt).velocity.tolist()
 
 
     def completeActionList(self,axle_length,dt=.1):
-        t = 0
-        action_list = []
-        while t<=self.traj_len_t+dt:
-            action_list.append(self.action(t,axle_length))
-            t += dt
+        samples = self.sample(dt,axle_length)
+        return list(zip(samples.acceleration.tolist(),samples.yaw_rate.tolist()))
+
+
+class TrajectorySamples():
+    """Array-backed sampling of a trajectory; one entry per timepoint in t"""
+    __slots__ = ("t","x","y","velocity","heading","acceleration","yaw_rate")
+
+    def __init__(self,t,x,y,velocity,heading,acceleration=None,yaw_rate=None):
+        self.t = t
+        self.x = x
+        self.y = y
+        self.velocity = velocity
+        self.heading = heading
+        self.acceleration = acceleration
+        self.yaw_rate = yaw_rate
+
 
-        return action_list
+    def __len__(self):
+        return len(self.t)
+
+
+    def positions(self):
+        """Positions as an (N,2) array"""
+        return np.stack((self.x,self.y),axis=-1)
 
 
 def laneChange(init_state,dest_state,T):
+    coefs_x,coefs_y = laneChangeCoefs(init_state,dest_state,T)
+    line_x = Line(*coefs_x)
+    line_y = Line(*coefs_y)
+
+    return line_x,line_y
+
+
+def laneChangeCoefs(init_state,dest_state,T):
+    """Closed form coefficients (highest power first) of the quadratic x and cubic y
+       paths taking init_state to dest_state in T seconds"""
     init_pos = init_state["position"]
     init_vel = init_state["velocity"]
     init_heading = init_state["heading"]
@@ -190,15 +460,175 @@ def laneChange(init_state,dest_state,T):
     C_y = init_vel[1]
     D_y= init_pos[1]
 
-    line_y = Line(A_y,B_y,C_y,D_y)
-
     A_x = (dest_vel[0]-init_vel[0])/(2*T)
     B_x = init_vel[0]
     C_x = init_pos[0]
-    line_x = Line(A_x,B_x,C_x)
 
-    return line_x,line_y
+    return (A_x,B_x,C_x),(A_y,B_y,C_y,D_y)
+
+
+class LaneChangeTrajectoryBatch():
+    """Structure-of-arrays collection of lane change trajectories. Coefficient lists are
+       ordered highest power first, as in Line, and hold one array entry per trajectory.
+       Evaluation methods take a scalar t (one value per trajectory) or a 1D array of
+       timepoints (returns arrays of shape (number of trajectories, len(t)))"""
+    def __init__(self,coefs_x,coefs_y,T):
+        self.traj_len_t = T
+
+        A_x,B_x,C_x = coefs_x
+        A_y,B_y,C_y,D_y = coefs_y
+        self.x_h = [A_x,B_x,C_x]
+        self.y_h = [A_y,B_y,C_y,D_y]
+        self.x_dot_h = [A_x*2,B_x*1]
+        self.y_dot_h = [A_y*3,B_y*2,C_y*1]
+        self.x_dot_dot_h = [A_x*2*1]
+        self.y_dot_dot_h = [A_y*3*2,B_y*2*1]
+
+
+    def __len__(self):
+        return len(self.traj_len_t)
+
+
+    def _broadcast(self,t,coefs):
+        t = np.asarray(t,dtype=float)
+        if t.ndim == 0:
+            return evaluateArray(t,coefs)
+        else:
+            return evaluateArray(t,[coef[:,None] for coef in coefs])
+
+
+    def position(self,t):
+        return self._broadcast(t,self.x_h),self._broadcast(t,self.y_h)
+
+
+    def velocity(self,t):
+        x_dot = self._broadcast(t,self.x_dot_h)
+        y_dot = self._broadcast(t,self.y_dot_h)
+        return np.sqrt(x_dot*x_dot + y_dot*y_dot)
+
+
+    def heading(self,t):
+        return headingFromDerivatives(self._broadcast(t,self.x_dot_h),self._broadcast(t,self.y_dot_h))
+
+
+    def action(self,t,axle_length):
+        x_dot = self._broadcast(t,self.x_dot_h)
+        y_dot = self._broadcast(t,self.y_dot_h)
+        x_dot_dot = self._broadcast(t,self.x_dot_dot_h)
+        y_dot_dot = self._broadcast(t,self.y_dot_dot_h)
+
+        with np.errstate(divide='ignore',invalid='ignore'):
+            acceleration,yaw_rate = actionFromDerivatives(x_dot,y_dot,x_dot_dot,y_dot_dot,axle_length)
+
+        t = np.asarray(t,dtype=float)
+        if t.ndim == 0: past_end = t>self.traj_len_t
+        else: past_end = t[None,:]>self.traj_len_t[:,None]
+        acceleration = np.where(past_end,0.0,acceleration)
+        yaw_rate = np.where(past_end,0.0,yaw_rate)
+        return acceleration,yaw_rate
+
+
+    def state(self,t,axle_length=None):
+        state = {"position":self.position(t),"velocity":self.velocity(t),"heading":self.heading(t)}
+
+        if axle_length is not None:
+            state["acceleration"],state["yaw_rate"] = self.action(t,axle_length)
+        else:
+            state["acceleration"],state["yaw_rate"] = None,None
+
+        return state
+
+
+    def trajectory(self,i):
+        """Returns the i-th entry as a standalone LaneChangeTrajectory-compatible object"""
+        traj = LaneChangeTrajectory.__new__(LaneChangeTrajectory)
+        traj.traj_len_t = float(self.traj_len_t[i])
+        traj.line_x = Line(*[coef[i] for coef in self.x_h])
+        traj.line_y = Line(*[coef[i] for coef in self.y_h])
+        traj.computeDerivatives()
+        return traj
+
+
+def laneChangeBatch(init_states,dest_states,T):
+    """Vectorised laneChange. init_states and dest_states are state dictionaries whose entries
+       are arrays ("position" has shape (N,2)); these and the horizons T are broadcast against
+       each other. Returns a LaneChangeTrajectoryBatch holding all N trajectories"""
+    init_pos = np.asarray(init_states["position"],dtype=float)
+    dest_pos = np.asarray(dest_states["position"],dtype=float)
+
+    init_x,init_y,init_vel,init_heading,dest_y,dest_vel,dest_heading,T = np.broadcast_arrays(\
+            init_pos[...,0],init_pos[...,1],init_states["velocity"],init_states["heading"],\
+            dest_pos[...,1],dest_states["velocity"],dest_states["heading"],np.asarray(T,dtype=float))
+    init_x,init_y,init_vel,init_heading,dest_y,dest_vel,dest_heading,T = \
+            [np.array(x,dtype=float,ndmin=1).ravel() for x in (init_x,init_y,init_vel,init_heading,dest_y,dest_vel,dest_heading,T)]
+
+    #Translate to global coordinates
+    init_vel = (init_vel*np.cos(np.radians(init_heading)),-init_vel*np.sin(np.radians(init_heading)))
+    dest_vel = (dest_vel*np.cos(np.radians(dest_heading)),-dest_vel*np.sin(np.radians(dest_heading)))
+
+    A_y = (2/T**3)*((T/2)*init_vel[1]+init_y-dest_y)
+    B_y = (1/(2*T))*(-3*A_y*T**2 - init_vel[1])
+    C_y = init_vel[1]
+    D_y = init_y
+
+    A_x = (dest_vel[0]-init_vel[0])/(2*T)
+    B_x = init_vel[0]
+    C_x = init_x
+
+    return LaneChangeTrajectoryBatch((A_x,B_x,C_x),(A_y,B_y,C_y,D_y),T)
+
+
+def laneChangeGrid(init_state,dest_state,T_values,dest_velocities=None,lateral_offsets=None):
+    """Builds the batch of lane changes from a single init_state covering every combination of
+       horizon in T_values, destination velocity in dest_velocities and lateral offset (added to the
+       destination y coordinate) in lateral_offsets. Returns the batch and a dictionary of the
+       flattened grid values, in the same order as the batch entries"""
+    if dest_velocities is None: dest_velocities = [dest_state["velocity"]]
+    if lateral_offsets is None: lateral_offsets = [0]
+
+    T_grid,vel_grid,offset_grid = [x.ravel() for x in np.meshgrid(T_values,dest_velocities,lateral_offsets,indexing="ij")]
+
+    dest_states = {"position":np.stack([np.full(offset_grid.shape,dest_state["position"][0],dtype=float),dest_state["position"][1]+offset_grid],axis=-1),\
+                   "velocity":vel_grid,"heading":dest_state["heading"]}
+    batch = laneChangeBatch(init_state,dest_states,T_grid)
+
+    return batch,{"T":T_grid,"dest_velocity":vel_grid,"lateral_offset":offset_grid}
 
 
 def evaluate(t,coefs):
     return sum([entry[0]*(t**entry[1]) for entry in coefs])
+
+
+def actionFromDerivatives(x_dot,y_dot,x_dot_dot,y_dot_dot,axle_length):
+    """Vectorised acceleration and yaw rate (degrees) that follow the path with the given
+       derivatives. Agrees with LaneChangeTrajectory.action up to rounding in arctan; zero
+       velocity gives nan or inf where action raises"""
+    denom_a = np.sqrt(x_dot*x_dot + y_dot*y_dot)
+    denom_yaw = denom_a*denom_a*denom_a
+
+    acceleration = ((x_dot*x_dot_dot)+(y_dot*y_dot_dot))/denom_a
+    yaw_rate = np.degrees(np.arctan(((x_dot*-y_dot_dot)-(-y_dot*x_dot_dot))*axle_length/denom_yaw))
+    return acceleration,yaw_rate
+
+
+def headingFromDerivatives(x_dot,y_dot):
+    """Vectorised heading (degrees) of a path with the given velocity components"""
+    #minus here to capture the axis flip
+    y_dot = -y_dot
+
+    with np.errstate(divide='ignore',invalid='ignore'):
+        heading = np.degrees(np.arctan(y_dot/x_dot))
+    heading = np.where(x_dot<0,(heading+180)%360,heading)#atan has domain (-90,90)
+    heading = np.where(x_dot==0,np.where(y_dot>0,90.0,270.0),heading)
+
+    return heading%360
+
+
+def evaluateArray(t,coefs):
+    """Evaluates the polynomial with coefficients coefs (highest power first) at every
+       entry of the array t. Coefficients may themselves be arrays, in which case they
+       are broadcast against t"""
+    res = np.zeros(np.broadcast(t,coefs[0]).shape)
+    for coef in coefs:
+        res = res*t + coef
+    return res
@@ -0,0 +1,251 @@
+"""Declarative triggers for the experiments, compiled into a shared plan of plain callables (see
+   TriggerPlan). The plan does less than a single vectorised pass per tick with shared x/y gaps:
+     - lane checks and conjunctions shared by several triggers are evaluated once and reused until
+       the next car steps
+     - the x and y gaps are not shared; each comparison computes its own, since looking up a shared
+       gap cost more than the subtraction
+     - nothing is vectorised across cars or triggers. With the two or three cars and handful of
+       triggers of these scenarios, an earlier numpy version cost about 125 us per tick against
+       about 5 us for the closures it replaced (benchmarks/bench_triggers.py)"""
+import math
+import operator
+
+#Relations a comparison can use; anything else is treated as '>', as the original triggers did
+RELATIONS = {'<':operator.lt,'>':operator.gt,'=':operator.eq}
+
+#Quantities a comparison can be made on
+X,DX,ABS_DY,DIST,HEADING = range(5)
+
+
+###################################################################################################################
+#Trigger expressions. These only describe a predicate; TriggerPlan.compile turns them into callables
+
+class TriggerExpression():
+    def key(self):
+        """Structural identity; expressions with equal keys are evaluated once and shared"""
+        raise NotImplementedError
+
+
+class Comparison(TriggerExpression):
+    def __init__(self,quantity,cars,threshold,rel):
+        self.quantity = quantity
+        self.cars = cars
+        self.threshold = threshold
+        self.rel = rel
+
+
+    def key(self):
+        return ("cmp",self.quantity,tuple([id(x) for x in self.cars]),self.threshold,self.rel)
+
+
+class RelativeX(Comparison):
+    """ego_car x - trigger_car x compared (rel) against radius"""
+    def __init__(self,ego_car,trigger_car,radius,rel='>'):
+        Comparison.__init__(self,DX,(ego_car,trigger_car),radius,rel)
+
+
+class RelativeY(Comparison):
+    """|ego_car y - trigger_car y| compared (rel) against radius"""
+    def __init__(self,ego_car,trigger_car,radius,rel='>'):
+        Comparison.__init__(self,ABS_DY,(ego_car,trigger_car),radius,rel)
+
+
+class Radius(Comparison):
+    """Triggered if trigger car is closer than radius to ego car"""
+    def __init__(self,ego_car,trigger_car,radius):
+        Comparison.__init__(self,DIST,(ego_car,trigger_car),radius,'<')
+
+
+class Ahead(Comparison):
+    """Triggered if trigger car is further along the road (x) than ego car"""
+    def __init__(self,ego_car,trigger_car):
+        Comparison.__init__(self,DX,(trigger_car,ego_car),0,'>')
+
+
+class DistanceTravelled(Comparison):
+    """Triggered once the car's x position passes threshold"""
+    def __init__(self,car,threshold):
+        Comparison.__init__(self,X,(car,),threshold,'>')
+
+
+class Heading(Comparison):
+    """Triggered if the car's heading is within radius degrees of 0"""
+    def __init__(self,car,radius):
+        Comparison.__init__(self,HEADING,(car,),radius,'<')
+
+
+class OnLane(TriggerExpression):
+    """Triggered if trigger car is on the same lane as ego car"""
+    def __init__(self,ego_car,trigger_car):
+        self.cars = (ego_car,trigger_car)
+
+
+    def key(self):
+        return ("on_lane",tuple([id(x) for x in self.cars]))
+
+
+class Idle(TriggerExpression):
+    """Triggered if the car is neither accelerating nor turning"""
+    def __init__(self,car):
+        self.cars = (car,)
+
+
+    def key(self):
+        return ("idle",id(self.cars[0]))
+
+
+class And(TriggerExpression):
+    """Triggered if every trigger is. An empty conjunction is always triggered"""
+    def __init__(self,triggers):
+        self.triggers = list(triggers)
+
+
+    def key(self):
+        return ("and",tuple([x.key() for x in self.triggers]))
+
+
+###################################################################################################################
+
+class TriggerPlan():
+    """Compiles trigger expressions into plain callables usable as simulator triggers. Identical
+       sub-expressions become one node, shared by every trigger and conjunction that uses them.
+       With per_tick set, the value of each lane check and conjunction is kept once computed until
+       invalidate is called, so it is evaluated at most once between invalidations however many
+       triggers use it; the harness invalidates the plan as each car steps. Comparisons are cheaper
+       to evaluate again than to look up, so are never kept. Without per_tick nothing is kept
+       between calls. Nodes read the cars' current state when evaluated, and conjunctions stop at
+       their first false child, as the closures they replace did"""
+    def __init__(self,per_tick=False):
+        self.per_tick = per_tick
+        self.nodes = [] #(expression,cars) or ("and",children) per node, for naming
+        self.node_index = {}
+        self.functions = [] #evaluates each node, reusing its kept value if it has one
+        self.values = [] #kept value of each node, None if not kept since the last invalidate
+        self.blank = []
+        self.lane_class = None
+        self.triggers = set() #nodes already handed out as triggers
+
+
+    def compile(self,expression):
+        """Registers the expression and returns a callable usable as a simulator trigger"""
+        index = self._addNode(expression)
+        node = self.functions[index]
+        if self.per_tick and index not in self.triggers:
+            trigger = node
+        elif self.per_tick:
+            #Each compile returns a distinct callable, so both can be keys of the same trigger dictionary
+            trigger = lambda: node()
+        else:
+            def trigger():
+                self.invalidate()
+                return node()
+        trigger.plan = self
+        trigger.index = index
+        self.triggers.add(index)
+        return trigger
+
+
+    def invalidate(self):
+        """Forgets every kept value, so nodes are evaluated afresh from the cars' new states"""
+        self.values[:] = self.blank
+
+
+    def _addNode(self,expression):
+        key = expression.key()
+        if key in self.node_index:
+            return self.node_index[key]
+
+        if isinstance(expression,And):
+            #Children first, so they come before their parent
+            children = [self._addNode(x) for x in expression.triggers]
+        index = len(self.nodes)
+        if isinstance(expression,And):
+            node = ("and",children)
+            function = kept(self.values,index,conjunction([self.functions[x] for x in children]))
+        elif isinstance(expression,Comparison):
+            node = (expression,list(expression.cars))
+            function = comparison(expression.quantity,expression.cars[0],expression.cars[-1],expression.threshold,\
+                                  RELATIONS.get(expression.rel,operator.gt))
+        elif isinstance(expression,Idle):
+            node = (expression,list(expression.cars))
+            function = idle(expression.cars[0])
+        else:
+            node = (expression,list(expression.cars))
+            function = kept(self.values,index,sameLane(expression.cars[0],expression.cars[1],self._laneClass()))
+        self.node_index[key] = index
+        self.nodes.append(node)
+        self.values.append(None)
+        self.blank.append(None)
+        self.functions.append(function)
+        return index
+
+
+    def _laneClass(self):
+        if self.lane_class is None:
+            #Imported here so the trigger expressions can be imported (by scenario specs) without the simulator
+            import road_classes
+            self.lane_class = road_classes.Lane
+        return self.lane_class
+
+
+###################################################################################################################
+#Node functions built by TriggerPlan
+
+def kept(values,index,evaluate):
+    def f():
+        value = values[index]
+        if value is None:
+            value = values[index] = evaluate()
+        return value
+
+    return f
+
+
+def comparison(quantity,ego_car,trigger_car,threshold,relation):
+    if quantity == X:
+        return lambda: relation(ego_car.state["position"][0],threshold)
+    elif quantity == DX:
+        return lambda: relation(ego_car.state["position"][0]-trigger_car.state["position"][0],threshold)
+    elif quantity == ABS_DY:
+        return lambda: relation(abs(ego_car.state["position"][1]-trigger_car.state["position"][1]),threshold)
+    elif quantity == DIST:
+        def f():
+            dx = ego_car.state["position"][0]-trigger_car.state["position"][0]
+            dy = ego_car.state["position"][1]-trigger_car.state["position"][1]
+            return relation(math.sqrt(dx*dx + dy*dy),threshold)
+        return f
+    else:
+        def f():
+            heading = abs(ego_car.state["heading"])
+            return relation(min(heading,360-heading),threshold)
+        return f
+
+
+def sameLane(ego_car,trigger_car,lane_class):
+    #A direct scan of the two cars' "on" lists. This used to go through a LaneOccupancy index
+    # (car -> lanes, lane -> cars) rebuilt once per step, but with the two or three cars of these
+    # scenarios building it cost more than the checks it replaced: on benchmarks/bench_triggers.py
+    # the plan went from about 1.2x faster than the original closures to about 0.8x. Each lane
+    # check is kept for the step instead, so one shared by several triggers still runs once
+    def f():
+        trigger_on = trigger_car.on
+        for x in ego_car.on:
+            if isinstance(x,lane_class) and x in trigger_on:
+                return True
+        return False
+
+    return f
+
+
+def idle(car):
+    return lambda: car.accel == 0 and car.yaw_rate == 0
+
+
+def conjunction(children):
+    def f():
+        for child in children:
+            if not child():
+                return False
+        return True
+
+    return f